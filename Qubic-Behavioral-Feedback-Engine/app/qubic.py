@@ -17,11 +17,14 @@ from qubic_templates import TEMPLATE_DISPATCH, TEMPLATE_OVERRIDES, tpl_simple_in
 
 from storage import (
     load_user_state,
-    save_user_state,
+    mark_state_clean,
+    persist_user_state,
     merge_state,
     has_password,
     verify_password,
     set_password_fields,
+    AuthBusy,
+    AuthThrottled,
 )
 
 # =========================
@@ -73,16 +76,23 @@ def _load_persisted_state_once(user_id: str) -> None:
     loaded = load_user_state(user_id)
     if loaded:
         st.session_state.user_state = merge_state(DEFAULT_USER_STATE, loaded)
+        mark_state_clean(user_id, st.session_state.user_state)
 
     st.session_state["_persist_loaded_for"] = user_id
 
 
+def _load_full_state(user_id: str):
+    """Saved state with its histories, retried once; None if it can't be read."""
+    full = load_user_state(user_id)
+    return full if full is not None else load_user_state(user_id)
+
+
 def _persist_state_now() -> None:
-    """Persist current user_state to disk (local JSON) if user_id is known."""
+    """Queue current user_state for the background writer if it changed."""
     user_id = _current_user_id()
     if not user_id or user_id == "anonymous":
         return
-    save_user_state(user_id, get_user_state())
+    persist_user_state(user_id, get_user_state())
 
 
 @st.dialog("Sign in", dismissible=False, width="small")
@@ -127,7 +137,8 @@ def login_dialog():
         return
 
     user_id = name.lower()
-    saved = load_user_state(user_id) or {}
+    # Runs on every keystroke rerun: scalars only, histories load on sign-in.
+    saved = load_user_state(user_id, include_history=False) or {}
     needs_pw = has_password(saved)
 
     # Existing demo account with password
@@ -140,12 +151,27 @@ def login_dialog():
                 if not pw:
                     st.warning("Enter your password.")
                     return
-                if not verify_password(saved, pw):
+                try:
+                    ok = verify_password(saved, pw, user_id=user_id)
+                except AuthThrottled as e:
+                    st.error(f"Too many attempts. Try again in {e.retry_after:.0f}s.")
+                    return
+                except AuthBusy:
+                    st.warning("Sign-in is busy right now. Try again in a moment.")
+                    return
+                if not ok:
                     st.error("Wrong password.")
                     return
 
+                # Never fall back to `saved`: it has no histories, and the
+                # next persist would truncate the logs to match.
+                full = _load_full_state(user_id)
+                if full is None:
+                    st.error("Could not load your saved progress. Try again.")
+                    return
                 set_user_profile(name)
-                st.session_state.user_state = merge_state(DEFAULT_USER_STATE, saved)
+                st.session_state.user_state = merge_state(DEFAULT_USER_STATE, full)
+                mark_state_clean(user_id, st.session_state.user_state)
                 st.session_state["_logged_in_demo"] = True
                 st.session_state["_persist_loaded_for"] = user_id
                 st.rerun()
@@ -159,7 +185,7 @@ def login_dialog():
             if st.button("Confirm reset", use_container_width=True, key="demo_reset_confirm"):
                 fresh = dict(DEFAULT_USER_STATE)
                 fresh["username"] = name
-                save_user_state(user_id, fresh)
+                persist_user_state(user_id, fresh, force=True)
                 st.session_state.pop("_reset_user_id", None)
                 st.success("Reset done. Now you can set a new password.")
                 st.rerun()
@@ -172,11 +198,17 @@ def login_dialog():
     pw2 = st.text_input("Confirm password", type="password", key="demo_pw2")
 
     if st.button("Continue", use_container_width=True, key="demo_continue_btn"):
-        set_user_profile(name)
-
         # Merge existing save (if any) with defaults
-        merged = merge_state(DEFAULT_USER_STATE, saved) if saved else dict(DEFAULT_USER_STATE)
+        if saved:
+            full = _load_full_state(user_id)
+            if full is None:
+                st.error("Could not load your saved progress. Try again.")
+                return
+            merged = merge_state(DEFAULT_USER_STATE, full)
+        else:
+            merged = dict(DEFAULT_USER_STATE)
         merged["username"] = name
+        set_user_profile(name)
 
         # If they want a password, validate + hash it
         if pw1 or pw2:
@@ -186,14 +218,18 @@ def login_dialog():
             if len(pw1) < 4:
                 st.error("Password too short (min 4).")
                 return
-            merged = set_password_fields(merged, pw1)
+            try:
+                merged = set_password_fields(merged, pw1)
+            except AuthBusy:
+                st.warning("Sign-in is busy right now. Try again in a moment.")
+                return
 
         st.session_state.user_state = merged
         st.session_state["_logged_in_demo"] = True
         st.session_state["_persist_loaded_for"] = user_id
 
         # Save immediately so “remember me” works right away
-        save_user_state(user_id, merged)
+        persist_user_state(user_id, merged, force=True)
 
         # Welcome bonus only if truly new
         if not saved:
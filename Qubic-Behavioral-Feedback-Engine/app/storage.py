@@ -1,8 +1,17 @@
 # app/storage.py
 
+import atexit
+import copy
+import hmac
 import json
 import os
-from typing import Any, Dict, Optional
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
 import hashlib
 import secrets
 
@@ -10,6 +19,25 @@ import secrets
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# "json" (one file per user, the default) or "sqlite"
+STORAGE_BACKEND_ENV = "CROWDLIKE_STORAGE_BACKEND"
+# SQLite database path (default: app/data/users.db)
+STORAGE_DB_ENV = "CROWDLIKE_STORAGE_DB"
+
+# PBKDF2 rounds for new passwords; KDF threads; KDF jobs queued or running
+KDF_ROUNDS_ENV = "CROWDLIKE_KDF_ROUNDS"
+KDF_WORKERS_ENV = "CROWDLIKE_KDF_WORKERS"
+KDF_QUEUE_ENV = "CROWDLIKE_KDF_QUEUE"
+# Failed logins allowed per user within LOGIN_WINDOW seconds
+LOGIN_ATTEMPTS = 5
+LOGIN_WINDOW = 60.0
+
+# Parsed user states kept in memory (LRU)
+USER_CACHE_SIZE = 256
+
+# Unbounded per-user histories: kept in an append-only log, not the snapshot.
+HISTORY_KEYS = ("xp_events", "test_history", "token_trades")
+
 def _safe_id(user_id: str) -> str:
     user_id = (user_id or "").strip()
     safe = "".join(c for c in user_id if c.isalnum() or c in ("-", "_", ".", "@"))
@@ -18,25 +46,673 @@ def _safe_id(user_id: str) -> str:
 def _path(user_id: str) -> str:
     return os.path.join(DATA_DIR, f"user_{_safe_id(user_id)}.json")
 
-def load_user_state(user_id: str) -> Optional[Dict[str, Any]]:
-    p = _path(user_id)
-    if not os.path.exists(p):
+def _history_path(user_id: str) -> str:
+    return os.path.join(DATA_DIR, f"user_{_safe_id(user_id)}.history.jsonl")
+
+def _history_lines(kind: str, records: List[Any]) -> str:
+    return "".join(
+        json.dumps({"k": kind, "r": r}, ensure_ascii=False, separators=(",", ":")) + "\n"
+        for r in records
+    )
+
+def _drop_torn_tail(f) -> None:
+    """Cut a partial last line (a crash mid-append) so appends start clean."""
+    end = f.seek(0, os.SEEK_END)
+    if end == 0:
+        return
+    f.seek(end - 1)
+    if f.read(1) == b"\n":
+        return
+    pos = end
+    cut = 0
+    while pos > 0:
+        start = max(0, pos - 4096)
+        f.seek(start)
+        nl = f.read(pos - start).rfind(b"\n")
+        if nl >= 0:
+            cut = start + nl + 1
+            break
+        pos = start
+    f.truncate(cut)
+
+
+class JsonFileBackend:
+    """One pretty-printed JSON file per user under DATA_DIR."""
+
+    name = "json"
+
+    @property
+    def key(self) -> tuple:
+        """Stable identity for per-backend caches: the data directory."""
+        return (self.name, os.path.abspath(DATA_DIR))
+
+    def load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        p = _path(user_id)
+        if not os.path.exists(p):
+            return None
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else None
+        except Exception:
+            return None
+
+    def save(self, user_id: str, state: Dict[str, Any]) -> None:
+        p = _path(user_id)
+        # Write a sibling temp file and rename it over, so a crash mid-write
+        # never leaves a truncated save behind.
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, p)
+        except Exception:
+            # Don’t crash the app if disk write fails
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def version(self, user_id: str) -> Optional[tuple]:
+        """(mtime, size) of the snapshot and history files; None if unsaved."""
+        out = []
+        for p in (_path(user_id), _history_path(user_id)):
+            try:
+                st = os.stat(p)
+            except OSError:
+                out.append(None)
+                continue
+            out.append((st.st_mtime_ns, st.st_size))
+        return tuple(out) if out[0] is not None else None
+
+    def load_history(self, user_id: str) -> Dict[str, List[Any]]:
+        out: Dict[str, List[Any]] = {}
+        try:
+            with open(_history_path(user_id), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash mid-append
+                    out.setdefault(row["k"], []).append(row["r"])
+        except FileNotFoundError:
+            pass
+        return out
+
+    def history_counts(self, user_id: str) -> Dict[str, int]:
+        return {kind: len(rows) for kind, rows in self.load_history(user_id).items()}
+
+    def append_history(self, user_id: str, kind: str, records: List[Any]) -> None:
+        with open(_history_path(user_id), "ab+") as f:
+            _drop_torn_tail(f)
+            f.write(_history_lines(kind, records).encode("utf-8"))
+
+    def truncate_history(self, user_id: str, kind: str) -> None:
+        kept = {k: rows for k, rows in self.load_history(user_id).items() if k != kind}
+        p = _history_path(user_id)
+        # Rewrite the other kinds into a temp file and rename it over, so a
+        # failure midway never loses them.
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for k, rows in kept.items():
+                    f.write(_history_lines(k, rows))
+            os.replace(tmp, p)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+
+class SQLiteBackend:
+    """All users in one SQLite database in WAL mode.
+
+    Connections come from a small per-process pool shared by every thread
+    (Streamlit starts a fresh script thread on each rerun, so per-thread
+    connections would be opened and abandoned constantly). At most
+    pool_size connections exist at once; a forked child starts a new pool.
+    WAL lets readers proceed while a writer commits.
+    """
+
+    name = "sqlite"
+
+    @property
+    def key(self) -> tuple:
+        """Stable identity for per-backend caches: the database file."""
+        return (self.name, os.path.abspath(self.path))
+
+    def __init__(self, path: Optional[str] = None, pool_size: int = 4):
+        self.path = path or os.environ.get(STORAGE_DB_ENV) or os.path.join(DATA_DIR, "users.db")
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset_pool()
+
+    def _reset_pool(self) -> None:
+        # Connections inherited across a fork belong to the parent: drop them.
+        self._idle: List[sqlite3.Connection] = []
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._schema_ready = False
+        self._pid = os.getpid()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            ready = self._schema_ready
+        if not ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_state ("
+                " user_id TEXT PRIMARY KEY,"
+                " state TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " history_rev INTEGER NOT NULL DEFAULT 0)"
+            )
+            # Databases created before history_rev existed.
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(user_state)")}
+            if "history_rev" not in columns:
+                conn.execute(
+                    "ALTER TABLE user_state ADD COLUMN history_rev INTEGER NOT NULL DEFAULT 0"
+                )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_history ("
+                " user_id TEXT NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " record TEXT NOT NULL,"
+                " PRIMARY KEY (user_id, kind, seq))"
+            )
+            conn.commit()
+            with self._lock:
+                self._schema_ready = True
+        return conn
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a pooled connection for the duration of the block."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset_pool()
+            slots = self._slots
+        slots.acquire()
+        conn = None
+        try:
+            with self._lock:
+                if slots is self._slots and self._idle:
+                    conn = self._idle.pop()
+            if conn is None:
+                conn = self._connect()
+            yield conn
+        finally:
+            if conn is not None:
+                with self._lock:
+                    if slots is self._slots:
+                        self._idle.append(conn)
+                        conn = None
+                if conn is not None:
+                    conn.close()
+            slots.release()
+
+    def close(self) -> None:
+        """Close the idle connections; the pool reopens on next use."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self._conn() as conn:
+                row = conn.execute(
+                    "SELECT state FROM user_state WHERE user_id = ?", (_safe_id(user_id),)
+                ).fetchone()
+            if row is None:
+                return None
+            data = json.loads(row[0])
+            return data if isinstance(data, dict) else None
+        except Exception:
+            return None
+
+    def save(self, user_id: str, state: Dict[str, Any]) -> None:
+        try:
+            blob = json.dumps(state, ensure_ascii=False, separators=(",", ":"))
+            with self._conn() as conn, conn:
+                conn.execute(
+                    "INSERT INTO user_state (user_id, state, updated_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(user_id) DO UPDATE SET"
+                    " state = excluded.state, updated_at = excluded.updated_at",
+                    (_safe_id(user_id), blob, time.time()),
+                )
+        except Exception:
+            # Don’t crash the app if disk write fails
+            pass
+
+    def version(self, user_id: str) -> Optional[tuple]:
+        """(updated_at, history_rev) of the user; None if unsaved."""
+        try:
+            with self._conn() as conn:
+                row = conn.execute(
+                    "SELECT updated_at, history_rev FROM user_state WHERE user_id = ?",
+                    (_safe_id(user_id),),
+                ).fetchone()
+        except Exception:
+            return None
+        return tuple(row) if row is not None else None
+
+    def load_history(self, user_id: str) -> Dict[str, List[Any]]:
+        out: Dict[str, List[Any]] = {}
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT kind, record FROM user_history WHERE user_id = ? ORDER BY kind, seq",
+                (_safe_id(user_id),),
+            ).fetchall()
+        for kind, record in rows:
+            out.setdefault(kind, []).append(json.loads(record))
+        return out
+
+    def history_counts(self, user_id: str) -> Dict[str, int]:
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT kind, COUNT(*) FROM user_history WHERE user_id = ? GROUP BY kind",
+                (_safe_id(user_id),),
+            ).fetchall()
+        return dict(rows)
+
+    def append_history(self, user_id: str, kind: str, records: List[Any]) -> None:
+        uid = _safe_id(user_id)
+        with self._conn() as conn, conn:
+            (start,) = conn.execute(
+                "SELECT COUNT(*) FROM user_history WHERE user_id = ? AND kind = ?", (uid, kind)
+            ).fetchone()
+            conn.executemany(
+                "INSERT INTO user_history (user_id, kind, seq, record) VALUES (?, ?, ?, ?)",
+                [
+                    (uid, kind, start + i, json.dumps(r, ensure_ascii=False, separators=(",", ":")))
+                    for i, r in enumerate(records)
+                ],
+            )
+            self._bump_history_rev(conn, uid)
+
+    def truncate_history(self, user_id: str, kind: str) -> None:
+        uid = _safe_id(user_id)
+        with self._conn() as conn, conn:
+            conn.execute("DELETE FROM user_history WHERE user_id = ? AND kind = ?", (uid, kind))
+            self._bump_history_rev(conn, uid)
+
+    @staticmethod
+    def _bump_history_rev(conn: sqlite3.Connection, uid: str) -> None:
+        # Lets version() notice history changes without counting the rows.
+        conn.execute(
+            "UPDATE user_state SET history_rev = history_rev + 1 WHERE user_id = ?", (uid,)
+        )
+
+
+_BACKENDS = {"json": JsonFileBackend, "sqlite": SQLiteBackend}
+_backend = None
+_backend_lock = threading.Lock()
+
+def _backend_class(name: str):
+    try:
+        return _BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend: {name!r}") from None
+
+def get_backend():
+    """Active storage backend, picked from CROWDLIKE_STORAGE_BACKEND on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = (os.environ.get(STORAGE_BACKEND_ENV) or "json").strip().lower()
+                _backend = _backend_class(name)()
+    return _backend
+
+def set_backend(backend) -> None:
+    """Swap the storage backend (an instance or "json"/"sqlite")."""
+    global _backend
+    with _backend_lock:
+        old = _backend
+        _backend = _backend_class(backend)() if isinstance(backend, str) else backend
+    # Cached states, log counts and fingerprints describe the old store.
+    with _history_lock:
+        _history_written.clear()
+    with _fingerprint_lock:
+        _fingerprints.clear()
+    _state_cache.clear()
+    if old is not None and old is not _backend and hasattr(old, "close"):
+        old.close()
+
+# (backend key, user id) -> records already in the log, per history key
+_history_written: Dict[tuple, Dict[str, int]] = {}
+_history_lock = threading.Lock()
+
+class _UserStateCache:
+    """
+    Parsed states keyed by (backend, user, include_history), each tagged
+    with the backend's version of the user when it was read. A hit costs a
+    version check (a stat, or one primary-key lookup) instead of a parse.
+    """
+
+    def __init__(self, max_entries: int = USER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, version) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, version, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (version, state)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, backend, user_id: str) -> None:
+        uid = _safe_id(user_id)
+        with self._lock:
+            for include_history in (True, False):
+                self._entries.pop((backend.key, uid, include_history), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+_state_cache = _UserStateCache()
+
+def cache_stats() -> Dict[str, int]:
+    return _state_cache.stats()
+
+def _load_from_backend(backend, user_id: str, include_history: bool) -> Optional[Dict[str, Any]]:
+    state = backend.load(user_id)
+    if state is None:
         return None
+    if not include_history:
+        for kind in HISTORY_KEYS:
+            state.pop(kind, None)
+        return state
     try:
-        with open(p, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data if isinstance(data, dict) else None
+        history = backend.load_history(user_id)
     except Exception:
+        history = {}
+    for kind in HISTORY_KEYS:
+        # A pre-log inline list is kept until the next save migrates it.
+        state[kind] = history.get(kind) or list(state.get(kind) or [])
+    return state
+
+def load_user_state(user_id: str, include_history: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Scalar snapshot plus (unless include_history=False) the replayed history
+    logs. Without history, HISTORY_KEYS are left out entirely, so never save
+    such a state back. Served from the in-process cache while the backend's
+    version of the user is unchanged; callers always get their own copy.
+    """
+    # A queued write for this user may still be in flight; other users'
+    # writes are not waited on.
+    _writer.wait_for(user_id)
+    backend = get_backend()
+    key = (backend.key, _safe_id(user_id), include_history)
+    # Read the version first: a save landing mid-load leaves a stale tag,
+    # which only costs one extra reload.
+    version = backend.version(user_id)
+    if version is None:
         return None
+    state = _state_cache.get(key, version)
+    if state is None:
+        state = _load_from_backend(backend, user_id, include_history)
+        if state is None:
+            return None
+        _state_cache.put(key, version, state)
+    return copy.deepcopy(state)
+
+def _written_counts(backend, user_id: str) -> Dict[str, int]:
+    key = (backend.key, _safe_id(user_id))
+    counts = _history_written.get(key)
+    if counts is None:
+        counts = _history_written[key] = dict(backend.history_counts(user_id))
+    return counts
 
 def save_user_state(user_id: str, state: Dict[str, Any]) -> None:
-    p = _path(user_id)
+    """
+    Snapshot the scalar state; append only the new history records.
+    A history list shorter than what was logged (e.g. after a reset)
+    truncates that log and starts it over.
+    """
+    backend = get_backend()
     try:
-        with open(p, "w", encoding="utf-8") as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
+        with _history_lock:
+            counts = _written_counts(backend, user_id)
+            for kind in HISTORY_KEYS:
+                records = state.get(kind)
+                if not isinstance(records, list):
+                    continue
+                done = counts.get(kind, 0)
+                if len(records) < done:
+                    backend.truncate_history(user_id, kind)
+                    done = 0
+                if len(records) > done:
+                    backend.append_history(user_id, kind, records[done:])
+                counts[kind] = len(records)
     except Exception:
-        # Don’t crash the app if disk write fails
-        pass
+        # Don’t crash the app if disk write fails; recount on the next save
+        _history_written.pop((backend.key, _safe_id(user_id)), None)
+    backend.save(user_id, {k: v for k, v in state.items() if k not in HISTORY_KEYS})
+    _state_cache.invalidate(backend, user_id)
+
+def state_fingerprint(state: Dict[str, Any]) -> str:
+    """
+    Content hash of a user state: the scalar snapshot plus the length of
+    each history list (histories only ever grow or get reset).
+    """
+    scalars = {k: v for k, v in state.items() if k not in HISTORY_KEYS}
+    lengths = [len(state.get(kind) or []) for kind in HISTORY_KEYS]
+    raw = json.dumps([scalars, lengths], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+def _snapshot(state: Dict[str, Any]) -> Dict[str, Any]:
+    # History records are never edited once appended: copying the lists is
+    # enough. Everything else is small, so copy it deeply.
+    return {
+        k: (list(v) if k in HISTORY_KEYS and isinstance(v, list) else copy.deepcopy(v))
+        for k, v in state.items()
+    }
+
+class _BackgroundWriter:
+    """
+    Single daemon thread draining per-user pending snapshots. A newer
+    snapshot replaces a queued one for the same user, so a burst of reruns
+    costs one write.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        # safe user id -> (user id, snapshot), oldest first
+        self._pending: Dict[str, tuple] = {}
+        # safe user ids being written right now
+        self._writing: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        # Serializes writes between the worker and an exit-time drain.
+        self._write_lock = threading.Lock()
+        self.written = 0
+        self.coalesced = 0
+
+    def submit(self, user_id: str, state: Dict[str, Any]) -> None:
+        key = _safe_id(user_id)
+        with self._cond:
+            if key in self._pending:
+                self.coalesced += 1
+                del self._pending[key]  # requeue at the back
+            self._pending[key] = (user_id, state)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="crowdlike-storage-writer", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def _take(self, key: Optional[str] = None):
+        with self._cond:
+            if key is None:
+                if not self._pending:
+                    return None
+                key = next(iter(self._pending))
+            elif key not in self._pending:
+                return None
+            self._writing[key] = self._writing.get(key, 0) + 1
+            return key, self._pending.pop(key)
+
+    def _write(self, taken) -> None:
+        key, item = taken
+        try:
+            with self._write_lock:
+                save_user_state(*item)
+        except Exception:
+            # Don’t kill the writer if one save fails
+            pass
+        finally:
+            with self._cond:
+                if self._writing[key] == 1:
+                    del self._writing[key]
+                else:
+                    self._writing[key] -= 1
+                self.written += 1
+                self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            taken = self._take()
+            if taken is not None:
+                self._write(taken)
+
+    def _worker_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait_for(self, user_id: str) -> None:
+        """Block only while this user has a write queued or in progress."""
+        key = _safe_id(user_id)
+        with self._cond:
+            while (key in self._pending or key in self._writing) and self._worker_alive():
+                self._cond.wait()
+        taken = self._take(key)
+        if taken is not None:
+            self._write(taken)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until nothing is queued or being written; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while (self._pending or self._writing) and self._worker_alive():
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._cond.wait(left)
+        # No live worker (e.g. at interpreter exit): drain on this thread.
+        while True:
+            taken = self._take()
+            if taken is None:
+                return True
+            self._write(taken)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending) + sum(self._writing.values())
+
+_writer = _BackgroundWriter()
+# Fingerprint of the last state queued or loaded, per (backend, user).
+_fingerprints: Dict[tuple, str] = {}
+_fingerprint_lock = threading.Lock()
+
+def mark_state_clean(user_id: str, state: Dict[str, Any]) -> None:
+    """Record state as already persisted (e.g. right after loading it)."""
+    key = (get_backend().key, _safe_id(user_id))
+    with _fingerprint_lock:
+        _fingerprints[key] = state_fingerprint(state)
+
+def persist_user_state(user_id: str, state: Dict[str, Any], force: bool = False) -> bool:
+    """
+    Queue a snapshot of state for the background writer, unless it is
+    unchanged since the last one queued for this user (force=True skips
+    that check). Returns True if a write was queued.
+    """
+    key = (get_backend().key, _safe_id(user_id))
+    fp = state_fingerprint(state)
+    with _fingerprint_lock:
+        if not force and _fingerprints.get(key) == fp:
+            return False
+        _fingerprints[key] = fp
+    _writer.submit(user_id, _snapshot(state))
+    return True
+
+def flush_pending_writes(timeout: Optional[float] = None) -> bool:
+    """Wait for queued background writes to reach the backend."""
+    return _writer.flush(timeout)
+
+def writer_stats() -> Dict[str, int]:
+    return {
+        "pending": _writer.pending(),
+        "written": _writer.written,
+        "coalesced": _writer.coalesced,
+    }
+
+atexit.register(flush_pending_writes)
+
+def migrate_json_to_sqlite(db_path: Optional[str] = None, src_dir: str = DATA_DIR) -> int:
+    """
+    One-shot copy of every user_*.json (and its .history.jsonl log) under
+    src_dir into SQLite. Returns the number of users migrated; the JSON
+    files are left in place.
+    """
+    target = SQLiteBackend(db_path)
+    migrated = 0
+    try:
+        for fname in sorted(os.listdir(src_dir)):
+            if not (fname.startswith("user_") and fname.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(src_dir, fname), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception:
+                continue
+            if not isinstance(data, dict):
+                continue
+            user_id = fname[len("user_"):-len(".json")]
+            target.save(user_id, data)
+            hist = os.path.join(src_dir, f"user_{user_id}.history.jsonl")
+            if os.path.exists(hist) and not target.history_counts(user_id):
+                rows: Dict[str, List[Any]] = {}
+                with open(hist, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            row = json.loads(line)
+                        except ValueError:
+                            continue
+                        rows.setdefault(row["k"], []).append(row["r"])
+                for kind, records in rows.items():
+                    target.append_history(user_id, kind, records)
+            migrated += 1
+    finally:
+        target.close()
+    return migrated
 
 def merge_state(defaults: Dict[str, Any], loaded: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -46,6 +722,137 @@ def merge_state(defaults: Dict[str, Any], loaded: Dict[str, Any]) -> Dict[str, A
     if isinstance(loaded, dict):
         out.update(loaded)
     return out
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name) or default))
+    except ValueError:
+        return default
+
+KDF_ROUNDS = _env_int(KDF_ROUNDS_ENV, 200_000)
+
+
+class AuthBusy(RuntimeError):
+    """Too many password hashes already queued; try again shortly."""
+
+
+class AuthThrottled(RuntimeError):
+    """Too many failed logins for this user; retry_after is in seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many attempts, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class _KdfPool:
+    """
+    Bounded thread pool for PBKDF2. hashlib releases the GIL while hashing,
+    so the hashes run in parallel without stalling other sessions' scripts;
+    past the queue limit new jobs are refused instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_queued: int):
+        self.workers = workers
+        self.max_queued = max_queued
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._latencies: deque = deque(maxlen=1000)
+        self.rejected = 0
+
+    def _timed(self, password: str, salt_hex: str, rounds: int, submitted: float) -> str:
+        try:
+            return _pbkdf2_hash(password, salt_hex, rounds)
+        finally:
+            # From submit, so time spent queued behind other hashes counts.
+            elapsed = time.perf_counter() - submitted
+            with self._lock:
+                self._latencies.append(elapsed)
+                self._in_flight -= 1
+
+    def hash(self, password: str, salt_hex: str, rounds: int) -> str:
+        with self._lock:
+            if self._in_flight >= self.max_queued:
+                self.rejected += 1
+                raise AuthBusy("Password hashing queue is full")
+            self._in_flight += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="crowdlike-kdf"
+                )
+            executor = self._executor
+        try:
+            future = executor.submit(
+                self._timed, password, salt_hex, rounds, time.perf_counter()
+            )
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        return future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            ordered = sorted(self._latencies)
+            in_flight = self._in_flight
+
+        def pct(q: float) -> float:
+            # Nearest rank, in milliseconds.
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))] * 1000.0
+
+        return {
+            "count": len(ordered),
+            "in_flight": in_flight,
+            "rejected": self.rejected,
+            "p50_ms": pct(50),
+            "p90_ms": pct(90),
+            "p99_ms": pct(99),
+        }
+
+_kdf_pool = _KdfPool(_env_int(KDF_WORKERS_ENV, 2), _env_int(KDF_QUEUE_ENV, 8))
+
+def kdf_stats() -> Dict[str, Any]:
+    """
+    KDF latency percentiles (ms from submit, queue wait included, over the
+    last 1000 hashes) and queue counters.
+    """
+    return _kdf_pool.stats()
+
+# user id -> monotonic times of recent failed logins
+_login_failures: Dict[str, deque] = {}
+_login_lock = threading.Lock()
+
+def _reserve_attempt(user_id: str) -> float:
+    """
+    Count an attempt as failed up front, so concurrent guesses can't all
+    slip past the limit while their hashes run. Returns its timestamp.
+    """
+    now = time.monotonic()
+    with _login_lock:
+        failures = _login_failures.setdefault(user_id, deque())
+        while failures and now - failures[0] > LOGIN_WINDOW:
+            failures.popleft()
+        if len(failures) >= LOGIN_ATTEMPTS:
+            raise AuthThrottled(LOGIN_WINDOW - (now - failures[0]))
+        failures.append(now)
+        return now
+
+def _settle_attempt(user_id: str, stamp: float, ok: Optional[bool]) -> None:
+    """ok=True clears the user's failures; None (no verdict) drops the reservation."""
+    with _login_lock:
+        failures = _login_failures.get(user_id)
+        if failures is None:
+            return
+        if ok:
+            del _login_failures[user_id]
+        elif ok is None:
+            try:
+                failures.remove(stamp)
+            except ValueError:
+                pass
+
 def _pbkdf2_hash(password: str, salt_hex: str, rounds: int = 200_000) -> str:
     dk = hashlib.pbkdf2_hmac(
         "sha256",
@@ -59,10 +866,11 @@ def _pbkdf2_hash(password: str, salt_hex: str, rounds: int = 200_000) -> str:
 def set_password_fields(state: dict, password: str) -> dict:
     """
     Sets password fields on a state dict. Stores only salted hash + metadata.
+    Hashes on the KDF pool; raises AuthBusy if it is saturated.
     """
     salt = secrets.token_hex(16)  # 16 bytes salt
-    rounds = 200_000
-    pw_hash = _pbkdf2_hash(password, salt, rounds)
+    rounds = KDF_ROUNDS
+    pw_hash = _kdf_pool.hash(password, salt, rounds)
     state["auth_pw_salt"] = salt
     state["auth_pw_hash"] = pw_hash
     state["auth_pw_rounds"] = rounds
@@ -71,10 +879,23 @@ def set_password_fields(state: dict, password: str) -> dict:
 def has_password(state: dict) -> bool:
     return bool(state.get("auth_pw_salt")) and bool(state.get("auth_pw_hash"))
 
-def verify_password(state: dict, password: str) -> bool:
+def verify_password(state: dict, password: str, user_id: Optional[str] = None) -> bool:
+    """
+    Checks password against the stored hash on the KDF pool. With user_id,
+    failed attempts are counted and AuthThrottled is raised past
+    LOGIN_ATTEMPTS per LOGIN_WINDOW. Raises AuthBusy if the pool is saturated.
+    """
     salt = state.get("auth_pw_salt")
     pw_hash = state.get("auth_pw_hash")
     rounds = int(state.get("auth_pw_rounds") or 200_000)
     if not salt or not pw_hash:
         return False
-    return _pbkdf2_hash(password, salt, rounds) == pw_hash
+    if user_id is None:
+        return hmac.compare_digest(_kdf_pool.hash(password, salt, rounds), str(pw_hash))
+    stamp = _reserve_attempt(user_id)
+    ok = None
+    try:
+        ok = hmac.compare_digest(_kdf_pool.hash(password, salt, rounds), str(pw_hash))
+        return ok
+    finally:
+        _settle_attempt(user_id, stamp, ok)
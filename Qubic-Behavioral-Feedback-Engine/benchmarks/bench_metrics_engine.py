@@ -0,0 +1,233 @@
+"""Stage-by-stage benchmark for metrics_engine.
+
+Times event generation, daily strain, per-day TES/BSS, BMS and CFS across a
+grid of crowd sizes and horizons with ``profiling.StageProfiler`` (wall and
+CPU time, tracemalloc peak per stage), and writes machine-readable JSON so
+runs can be diffed.
+
+    python -m benchmarks.bench_metrics_engine --smoke
+    python -m benchmarks.bench_metrics_engine --users 25,1000,100000 \\
+        --days 14,90,365 --backend numpy --json bench.json
+
+The default grid runs every point, up to 100k users x 365 days; the python
+backend needs about 140 bytes per event record there. Pass --max-cells to
+skip points with more users x days cells (e.g. --max-cells 5000000 on small
+machines); the cap is recorded in the report's ``meta``.
+"""
+
+import argparse
+import json
+import platform
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics_engine.metrics_engine import (
+    _build_demo_events,
+    _compute_BMS,
+    _compute_BMS_history,
+    _compute_CFS,
+    _compute_daily_strain,
+    _compute_TES_BSS_for_day,
+    _iso_day,
+)
+from metrics_engine.profiling import StageProfiler
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only the python backend runs then
+    np = None
+
+DEFAULT_USERS = [25, 1_000, 10_000, 100_000]
+DEFAULT_DAYS = [14, 90, 365]
+SMOKE_USERS = [25, 200]
+SMOKE_DAYS = [14]
+
+
+def _measure(stage: str, fn: Callable[[], Any], prof: StageProfiler):
+    with prof.stage(stage):
+        return fn()
+
+
+def _stage_table(prof: StageProfiler) -> Dict[str, Dict]:
+    return {
+        s["stage"]: {
+            "seconds": s["wall_s"],
+            "cpu_seconds": s["cpu_s"],
+            "peak_bytes": s.get("peak_bytes"),
+        }
+        for s in prof.stages
+    }
+
+
+def _python_stages(users: int, days: int, seed: int, trace: bool) -> Dict[str, Any]:
+    prof = StageProfiler(trace_memory=trace)
+    events = _measure(
+        "generate",
+        lambda: _build_demo_events([], num_other_users=users, days=days, seed=seed),
+        prof,
+    )
+    daily_strain, daily_decision = _measure(
+        "daily_strain", lambda: _compute_daily_strain(events), prof
+    )
+    epoch_days = sorted({d for strain in daily_strain.values() for d in strain})[-days:]
+    days_list = [_iso_day(d) for d in epoch_days]
+
+    def score():
+        scores: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
+        for day, label in zip(epoch_days, days_list):
+            for user, s in _compute_TES_BSS_for_day(day, daily_strain, daily_decision).items():
+                scores[user][label] = s
+        return scores
+
+    scores = _measure("tes_bss", score, prof)
+    _measure("bms", lambda: _compute_BMS(scores, days_list), prof)
+    _measure(
+        "cfs",
+        lambda: _compute_CFS(_compute_BMS_history(scores, days_list)),
+        prof,
+    )
+    return {"events": sum(len(v) for v in events.values()), "stages": _stage_table(prof)}
+
+
+def _numpy_stages(users: int, days: int, seed: int, trace: bool) -> Dict[str, Any]:
+    from metrics_engine.columnar import daily_matrices
+    from metrics_engine.ranking import score_day_columns
+    from metrics_engine.synthetic import build_crowd_columns
+
+    prof = StageProfiler(trace_memory=trace)
+    cols = _measure(
+        "generate",
+        lambda: build_crowd_columns([], num_other_users=users, days=days, seed=seed),
+        prof,
+    )
+    day_values, strain, decision = _measure(
+        "daily_strain", lambda: daily_matrices(cols), prof
+    )
+    days_list = [_iso_day(d) for d in day_values.tolist()]
+
+    def score():
+        scores: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
+        for j, label in enumerate(days_list):
+            TES, BSS = score_day_columns(decision[:, j], strain[:, j])
+            for user, t, b in zip(cols.users, TES.tolist(), BSS.tolist()):
+                scores[user][label] = {"TES": t, "BSS": b}
+        return scores
+
+    scores = _measure("tes_bss", score, prof)
+    _measure("bms", lambda: _compute_BMS(scores, days_list), prof)
+    _measure(
+        "cfs",
+        lambda: _compute_CFS(_compute_BMS_history(scores, days_list)),
+        prof,
+    )
+    return {"events": len(cols), "stages": _stage_table(prof)}
+
+
+BACKENDS = {"python": _python_stages, "numpy": _numpy_stages}
+
+
+def run_benchmark(
+    users_grid: List[int],
+    days_grid: List[int],
+    backends: List[str],
+    seed: int = 0,
+    trace_memory: bool = True,
+    max_cells: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Run every (backend, users, days) grid point and return the JSON report.
+
+    max_cells: skip points with more users x days cells (None runs them all).
+    """
+    runs = []
+    for backend in backends:
+        for users in users_grid:
+            for days in days_grid:
+                if max_cells is not None and users * days > max_cells:
+                    runs.append(
+                        {"backend": backend, "users": users, "days": days, "skipped": "max_cells"}
+                    )
+                    continue
+                result = BACKENDS[backend](users, days, seed, trace_memory)
+                stages = result["stages"]
+                peaks = [s["peak_bytes"] for s in stages.values() if s["peak_bytes"] is not None]
+                runs.append(
+                    {
+                        "backend": backend,
+                        "users": users,
+                        "days": days,
+                        "seed": seed,
+                        "events": result["events"],
+                        "stages": stages,
+                        "total_seconds": sum(s["seconds"] for s in stages.values()),
+                        "peak_bytes": max(peaks) if peaks else None,
+                    }
+                )
+    return {
+        "meta": {
+            "created": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "numpy": getattr(np, "__version__", None),
+            "platform": platform.platform(),
+            "trace_memory": trace_memory,
+            "max_cells": max_cells,
+        },
+        "runs": runs,
+    }
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=_int_list, default=DEFAULT_USERS)
+    parser.add_argument("--days", type=_int_list, default=DEFAULT_DAYS)
+    parser.add_argument(
+        "--backend",
+        action="append",
+        choices=sorted(BACKENDS),
+        help="repeatable; defaults to python (+ numpy when installed)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--max-cells",
+        type=int,
+        default=None,
+        help="skip grid points with more users x days cells (default: run all)",
+    )
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="skip tracemalloc (it slows the timed stages down)",
+    )
+    parser.add_argument("--smoke", action="store_true", help="tiny grid for CI")
+    parser.add_argument("--json", dest="json_path", help="write the report here")
+    args = parser.parse_args(argv)
+
+    backends = args.backend or (["python", "numpy"] if np is not None else ["python"])
+    users, days = args.users, args.days
+    if args.smoke:
+        users, days = SMOKE_USERS, SMOKE_DAYS
+
+    report = run_benchmark(
+        users,
+        days,
+        backends,
+        seed=args.seed,
+        trace_memory=not args.no_memory,
+        max_cells=args.max_cells,
+    )
+    text = json.dumps(report, indent=2)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
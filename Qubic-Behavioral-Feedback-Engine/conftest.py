@@ -0,0 +1,2 @@
+# Puts this directory on sys.path so `metrics_engine` and `app` import
+# whether pytest runs from here, from the repo root, or as plain `pytest`.
@@ -1 +1,3 @@
-from .metrics_engine import compute_metrics
+from .metrics_engine import compute_metrics, compute_metrics_from_events
+from .streaming import MetricsEngine
+from .cache import cached_compute_metrics
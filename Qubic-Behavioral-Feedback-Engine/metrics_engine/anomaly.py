@@ -0,0 +1,146 @@
+"""Online detection of users whose daily strain jumps outside their history.
+
+``StrainAnomalyDetector`` keeps an exponentially weighted mean and variance
+of each user's past daily strain totals, plus the running total for the
+current day. Each event is O(1): it adds to today's total and compares it
+with the user's baseline; a z-score above ``threshold`` emits one anomaly
+record for that user-day. State per user is a fixed handful of numbers.
+
+Events are expected roughly in time order per user. Events for a day older
+than the user's current day are counted in ``late_events`` and skipped.
+"""
+
+import math
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .metrics_engine import _event_day, _event_strain, _iso_day
+
+# Idle days folded into the EWMA one by one; after this many the baseline
+# has decayed to ~0 at any sensible alpha, so the rest are skipped.
+_MAX_IDLE_FOLD = 64
+
+
+class _UserStats:
+    __slots__ = ("day", "total", "mean", "var", "days", "flagged")
+
+    def __init__(self, day: int):
+        self.day = day
+        self.total = 0.0
+        self.mean = 0.0
+        self.var = 0.0
+        self.days = 0
+        self.flagged = False
+
+    def fold(self, value: float, alpha: float) -> None:
+        # West's incremental EWMA mean/variance update.
+        if self.days == 0:
+            self.mean = value
+            self.var = 0.0
+        else:
+            diff = value - self.mean
+            incr = alpha * diff
+            self.mean += incr
+            self.var = (1.0 - alpha) * (self.var + diff * incr)
+        self.days += 1
+
+
+class StrainAnomalyDetector:
+    """Flags user-days whose strain exceeds the user's EWMA baseline.
+
+    alpha: EWMA weight of the newest day (0.2 ~ a 9-day memory).
+    threshold: z-score above which a day is anomalous.
+    warmup_days: past days a user needs before being judged.
+    min_std: floor on the baseline deviation, so flat histories don't flag
+    on tiny changes.
+    max_records: most recent anomaly records kept in ``records``.
+    sink: optional callable receiving each record as it is emitted.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        threshold: float = 3.0,
+        warmup_days: int = 5,
+        min_std: float = 1.0,
+        max_records: int = 1000,
+        sink: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("alpha must be in (0, 1]")
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup_days = warmup_days
+        self.min_std = min_std
+        self.records: deque = deque(maxlen=max_records)
+        self.sink = sink
+        self.late_events = 0
+        self._users: Dict[str, _UserStats] = {}
+
+    def observe(self, event: Any, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Feed one event (an ``Event`` or a dict); returns a record if it trips."""
+        user = user_id if user_id is not None else event["user_id"]
+        return self.observe_strain(user, _event_day(event), _event_strain(event))
+
+    def observe_strain(self, user: str, day: int, strain: float) -> Optional[Dict[str, Any]]:
+        """Feed ``strain`` already computed for ``user`` on epoch ``day``."""
+        stats = self._users.get(user)
+        if stats is None:
+            stats = self._users[user] = _UserStats(day)
+        elif day < stats.day:
+            self.late_events += 1
+            return None
+        elif day > stats.day:
+            stats.fold(stats.total, self.alpha)
+            for _ in range(min(day - stats.day - 1, _MAX_IDLE_FOLD)):
+                stats.fold(0.0, self.alpha)
+            stats.day = day
+            stats.total = 0.0
+            stats.flagged = False
+
+        stats.total += strain
+        if stats.flagged or stats.days < self.warmup_days:
+            return None
+        std = max(math.sqrt(stats.var), self.min_std)
+        z = (stats.total - stats.mean) / std
+        if z <= self.threshold:
+            return None
+
+        stats.flagged = True
+        record = {
+            "user_id": user,
+            "day": _iso_day(day),
+            "strain": stats.total,
+            "baseline_mean": stats.mean,
+            "baseline_std": std,
+            "z": z,
+        }
+        self.records.append(record)
+        if self.sink is not None:
+            self.sink(record)
+        return record
+
+    def backfill(self, user_events: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+        """Replay historical events (sorted by day per user); returns the records."""
+        found = []
+        for user, events in user_events.items():
+            for ev in sorted(events, key=_event_day):
+                record = self.observe(ev, user_id=user)
+                if record is not None:
+                    found.append(record)
+        return found
+
+    def baseline(self, user: str) -> Optional[Dict[str, float]]:
+        """Current EWMA baseline of ``user``, or None if never seen."""
+        stats = self._users.get(user)
+        if stats is None:
+            return None
+        return {
+            "mean": stats.mean,
+            "std": math.sqrt(stats.var),
+            "days": stats.days,
+            "today": stats.total,
+        }
+
+    def observe_many(self, events: Iterable[Any]) -> List[Dict[str, Any]]:
+        return [r for r in map(self.observe, events) if r is not None]
@@ -0,0 +1,348 @@
+"""Precomputed crowd baselines for scoring one user in O(days x log N).
+
+``compute_metrics`` regenerates and rescores the whole synthetic crowd to
+score "you". A ``CrowdBaseline`` stores what the crowd contributes instead:
+per-day sorted decisions and strains, "you"'s own synthetic history and the
+crowd's CFS cohort index. Scoring a user is then binary searches against
+those arrays, counting the user themselves into the population.
+
+TES/BSS and BMS for the user match ``compute_metrics`` for the same seed.
+CFS compares the user against the crowd as scored without them, which can
+differ slightly from a full run.
+
+Baselines are written as a small binary file: a JSON header followed by raw
+float64/int64 arrays. The header's ``version`` hashes the seed, crowd
+parameters, day anchor, scoring constants and ``ACTION_WEIGHTS``.
+"""
+
+import hashlib
+import json
+import math
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from .metrics_engine import (
+    ACTION_WEIGHTS,
+    CFS_DELTA,
+    CFS_TOL,
+    TES_EPSILON,
+    Event,
+    _build_demo_events,
+    _cfs_entry,
+    _CohortIndex,
+    _compute_BMS,
+    _compute_BMS_history,
+    _compute_daily_strain,
+    _compute_TES_BSS_for_day,
+    _epoch_day,
+    _event_day,
+    _event_strain,
+    _iso_day,
+)
+from .ranking import window_count
+
+FORMAT_VERSION = 1
+_MAGIC = b"CLBL"
+_HEADER_LEN = struct.Struct("<I")
+
+
+def baseline_version(
+    num_other_users: int,
+    days: int,
+    seed: int,
+    today: int,
+    epsilon: float = TES_EPSILON,
+    tol: float = CFS_TOL,
+) -> str:
+    """Hash identifying the crowd a baseline was built from."""
+    payload = {
+        "format": FORMAT_VERSION,
+        "num_other_users": int(num_other_users),
+        "days": int(days),
+        "seed": seed,
+        "today": int(today),
+        "epsilon": epsilon,
+        "tol": tol,
+        "weights": ACTION_WEIGHTS,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class CrowdBaseline:
+    """The crowd's side of a scoring run, ready for per-user lookups.
+
+    decisions / strains: per epoch day, the crowd's sorted values (one per
+    crowd user, zeros included). you_history: "you"'s synthetic strain per
+    day. cohort: ``_CohortIndex`` over the crowd's past/future BMS.
+    """
+
+    def __init__(
+        self,
+        header: Dict[str, Any],
+        decisions: Dict[int, array],
+        strains: Dict[int, array],
+        you_history: Dict[int, float],
+        cohort: _CohortIndex,
+    ):
+        self.header = header
+        self.decisions = decisions
+        self.strains = strains
+        self.you_history = you_history
+        self.cohort = cohort
+
+    @property
+    def version(self) -> str:
+        return self.header["version"]
+
+    @property
+    def crowd_size(self) -> int:
+        return self.header["crowd"]
+
+    def _user_strain(self, events: Iterable[Any], synthetic_history: bool) -> Dict[int, float]:
+        strain: Dict[int, float] = {}
+        for ev in events:
+            day = _event_day(ev)
+            strain[day] = strain.get(day, 0.0) + _event_strain(ev)
+        if synthetic_history:
+            for day, s in self.you_history.items():
+                strain[day] = strain[day] + s if day in strain else s
+        return strain
+
+    def _score_day(self, day: int, d_u: float, s_u: float) -> Dict[str, float]:
+        decisions = self.decisions.get(day)
+        strains = self.strains.get(day)
+        crowd = self.crowd_size
+        if strains is None:
+            # A day the crowd never saw: every crowd user sits at zero.
+            if s_u == 0:
+                return {"TES": 0.0, "BSS": 0.0}
+            tes_count = crowd if abs(0.0 - d_u) <= self.header["epsilon"] else 0
+            bss_count = crowd
+        else:
+            if s_u == 0 and (not strains or strains[-1] == 0):
+                return {"TES": 0.0, "BSS": 0.0}
+            tes_count = window_count(decisions, d_u, self.header["epsilon"])
+            bss_count = bisect_right(strains, s_u)
+        # The user is part of the population: +1 in every count and in n.
+        n = crowd + 1
+        return {
+            "TES": ((tes_count + 1) / n) * 100.0,
+            "BSS": ((bss_count + 1) / n) * 100.0,
+        }
+
+    def score_user(
+        self,
+        events: Iterable[Any],
+        user_id: str = "you",
+        synthetic_history: bool = True,
+        delta: float = CFS_DELTA,
+    ) -> Dict[str, Any]:
+        """Score one user's events against the crowd.
+
+        events: ``Event`` records or dict events of that user.
+        synthetic_history: add "you"'s seeded history, as ``compute_metrics`` does.
+        Returns the ``compute_metrics`` result shape, restricted to ``user_id``.
+        """
+        strain = self._user_strain(events, synthetic_history)
+        day_values = sorted(set(self.header["day_values"]) | set(strain))
+        day_values = day_values[-self.header["days"] :] if self.header["days"] > 0 else []
+        days_list = [_iso_day(day) for day in day_values]
+
+        scores = {}
+        for day, label in zip(day_values, days_list):
+            s_u = strain.get(day, 0.0)
+            scores[label] = self._score_day(day, math.log1p(s_u), s_u)
+
+        daily_scores = {user_id: scores}
+        history = _compute_BMS_history(daily_scores, days_list)[user_id]
+        # The user is not in the crowd index, so nothing to subtract.
+        counts = self.cohort.counts(history["past"], delta)
+        return {
+            "target_user": user_id,
+            "days": days_list,
+            "daily_scores": daily_scores,
+            "BMS": _compute_BMS(daily_scores, days_list),
+            "CFS": _cfs_entry(user_id, counts),
+            "score_mode": "baseline",
+        }
+
+    def score_actions(self, user_actions: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """``compute_metrics(user_actions, ...)`` for "you" against this baseline."""
+        now = datetime.utcnow()
+        events = []
+        for act in user_actions or []:
+            ts = act.get("timestamp")
+            events.append(
+                Event.from_dict({**act, "timestamp": ts if isinstance(ts, datetime) else now}, "you")
+            )
+        return self.score_user(events)
+
+    def save(self, path: str) -> None:
+        """Write the baseline to ``path`` atomically."""
+        header = dict(self.header)
+        header["byteorder"] = sys.byteorder
+        header["cohort"] = len(self.cohort.pasts)
+        header["you_history"] = {str(day): s for day, s in self.you_history.items()}
+        blob = json.dumps(header, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+        # A private temp name, so concurrent writers never share one.
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_MAGIC)
+                f.write(_HEADER_LEN.pack(len(blob)))
+                f.write(blob)
+                for day in header["day_values"]:
+                    self.decisions[day].tofile(f)
+                    self.strains[day].tofile(f)
+                array("d", self.cohort.pasts).tofile(f)
+                array("q", [c for row in self.cohort.prefix for c in row]).tofile(f)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path: str, expected_version: Optional[str] = None) -> "CrowdBaseline":
+        """Read a baseline; ValueError if it is corrupt or not ``expected_version``."""
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != _MAGIC:
+            raise ValueError(f"{path} is not a crowd baseline file")
+        (size,) = _HEADER_LEN.unpack_from(data, 4)
+        offset = 4 + _HEADER_LEN.size
+        header = json.loads(data[offset : offset + size])
+        offset += size
+        if header.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported baseline format: {header.get('format')!r}")
+        if expected_version is not None and header["version"] != expected_version:
+            raise ValueError("Baseline version does not match the requested crowd")
+
+        swap = header.pop("byteorder") != sys.byteorder
+        body = memoryview(data)
+
+        def take(typecode: str, count: int) -> array:
+            nonlocal offset
+            arr = array(typecode)
+            end = offset + count * arr.itemsize
+            arr.frombytes(body[offset:end])
+            if len(arr) != count:
+                raise ValueError(f"{path} is truncated")
+            if swap:
+                arr.byteswap()
+            offset = end
+            return arr
+
+        crowd = header["crowd"]
+        decisions: Dict[int, array] = {}
+        strains: Dict[int, array] = {}
+        for day in header["day_values"]:
+            decisions[day] = take("d", crowd)
+            strains[day] = take("d", crowd)
+        cohort_size = header.pop("cohort")
+        pasts = take("d", cohort_size)
+        flat = take("q", 3 * (cohort_size + 1))
+        prefix = [list(flat[i : i + 3]) for i in range(0, len(flat), 3)]
+        you_history = {int(day): s for day, s in header.pop("you_history").items()}
+        return cls(
+            header, decisions, strains, you_history,
+            _CohortIndex.from_sorted(pasts, prefix, header["tol"]),
+        )
+
+
+def build_baseline(
+    num_other_users: int = 25,
+    days: int = 14,
+    seed: int = 0,
+    epsilon: float = TES_EPSILON,
+    tol: float = CFS_TOL,
+) -> CrowdBaseline:
+    """Generate the seeded crowd once and index it for per-user scoring."""
+    if seed is None:
+        raise ValueError("Baselines need a fixed seed")
+    today = _epoch_day(datetime.utcnow())
+    user_events = _build_demo_events([], num_other_users=num_other_users, days=days, seed=seed)
+    you_events = user_events.pop("you", [])
+
+    daily_strain, daily_decision = _compute_daily_strain(user_events)
+    crowd_users = list(daily_strain)
+    observed = sorted({day for strain in daily_strain.values() for day in strain})
+    day_values = observed[-days:] if days > 0 else []
+
+    decisions: Dict[int, array] = {}
+    strains: Dict[int, array] = {}
+    daily_scores: Dict[str, Dict[str, Dict[str, float]]] = {u: {} for u in crowd_users}
+    for day in day_values:
+        decisions[day] = array("d", sorted(daily_decision[u].get(day, 0.0) for u in crowd_users))
+        strains[day] = array("d", sorted(daily_strain[u].get(day, 0.0) for u in crowd_users))
+        label = _iso_day(day)
+        for user, s in _compute_TES_BSS_for_day(day, daily_strain, daily_decision, epsilon).items():
+            daily_scores[user][label] = s
+
+    you_history, _ = _compute_daily_strain({"you": you_events})
+    history = _compute_BMS_history(daily_scores, [_iso_day(day) for day in day_values])
+    header = {
+        "format": FORMAT_VERSION,
+        "version": baseline_version(num_other_users, days, seed, today, epsilon, tol),
+        "seed": seed,
+        "num_other_users": num_other_users,
+        "days": days,
+        "today": today,
+        "epsilon": epsilon,
+        "tol": tol,
+        "crowd": len(crowd_users),
+        "day_values": day_values,
+    }
+    return CrowdBaseline(
+        header, decisions, strains, dict(you_history.get("you", {})), _CohortIndex(history, tol)
+    )
+
+
+def get_baseline(
+    cache_dir: str,
+    num_other_users: int = 25,
+    days: int = 14,
+    seed: int = 0,
+) -> CrowdBaseline:
+    """Load the current baseline from ``cache_dir``, building it if missing.
+
+    Building one also deletes baselines anchored to earlier days.
+    """
+    today = _epoch_day(datetime.utcnow())
+    version = baseline_version(num_other_users, days, seed, today)
+    path = os.path.join(cache_dir, f"baseline-{today}-{version[:16]}.bin")
+    if os.path.exists(path):
+        try:
+            return CrowdBaseline.load(path, expected_version=version)
+        except ValueError:
+            pass  # stale or damaged; rebuild below
+    baseline = build_baseline(num_other_users, days, seed)
+    os.makedirs(cache_dir, exist_ok=True)
+    baseline.save(path)
+    _prune_baselines(cache_dir, today)
+    return baseline
+
+
+def _prune_baselines(cache_dir: str, today: int) -> None:
+    for name in os.listdir(cache_dir):
+        if not (name.startswith("baseline-") and name.endswith(".bin")):
+            continue
+        day = name.split("-")[1]
+        if day.isdigit() and int(day) >= today:
+            continue
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            pass  # another session got there first
@@ -0,0 +1,150 @@
+"""Memoized ``compute_metrics`` shared by every session in the process.
+
+Streamlit reruns call into metrics even when nothing changed. Results are
+cached under a stable hash of the normalized ``user_actions`` plus the run
+parameters, in an LRU bounded by entry count and approximate byte size.
+
+A seed of ``None`` means "fresh randomness each call", so such calls are never
+cached, and neither are profiled calls. The synthetic crowd is anchored to the
+current UTC day, which is part of the key as well; ``workers`` is not, since it
+does not change the result.
+
+Entries are stored pickled and every hit unpickles a private copy, so one
+session mutating its result (or reading a missing user out of a
+``defaultdict``) never leaks into another's.
+"""
+
+import hashlib
+import json
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .metrics_engine import ACTION_WEIGHTS, _epoch_day, compute_metrics
+
+
+def _normalize_action(act: Dict[str, Any]) -> Dict[str, Any]:
+    # Mirror what _build_demo_events actually reads from each action.
+    ts = act.get("timestamp")
+    return {
+        "action_type": str(act.get("action_type", "other")).lower(),
+        "amount": float(act.get("amount", 0.0)),
+        "asset": str(act.get("asset", "QUBIC")),
+        "timestamp": ts.isoformat() if isinstance(ts, datetime) else None,
+    }
+
+
+def metrics_cache_key(
+    user_actions: Optional[List[Dict[str, Any]]],
+    num_other_users: int = 25,
+    days: int = 14,
+    seed: Optional[int] = None,
+    **options: Any,
+) -> Optional[str]:
+    """Stable content hash for a ``compute_metrics`` call, or None if uncacheable."""
+    if seed is None or options.get("profile"):
+        return None
+    options = {k: v for k, v in options.items() if k != "workers"}
+    payload = {
+        "actions": [_normalize_action(a) for a in user_actions or []],
+        "num_other_users": int(num_other_users),
+        "days": int(days),
+        "seed": seed,
+        "options": options,
+        "weights": ACTION_WEIGHTS,
+        "today": _epoch_day(datetime.utcnow()),
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class MetricsCache:
+    """Thread-safe LRU of metrics results, bounded by entries and bytes."""
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> pickled result
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncacheable = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(entry)
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = blob
+            self._bytes += len(blob)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def note_uncacheable(self) -> None:
+        with self._lock:
+            self.uncacheable += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "uncacheable": self.uncacheable,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+# Process-wide cache shared across Streamlit sessions.
+METRICS_CACHE = MetricsCache()
+
+
+def cached_compute_metrics(
+    user_actions: Optional[List[Dict[str, Any]]] = None,
+    num_other_users: int = 25,
+    days: int = 14,
+    seed: Optional[int] = None,
+    cache: Optional[MetricsCache] = None,
+    **options: Any,
+) -> Dict[str, Any]:
+    """``compute_metrics`` through ``cache`` (default: ``METRICS_CACHE``).
+
+    Every call gets its own copy of the result.
+    """
+    cache = METRICS_CACHE if cache is None else cache
+    key = metrics_cache_key(user_actions, num_other_users, days, seed, **options)
+    if key is None:
+        cache.note_uncacheable()
+        return compute_metrics(user_actions, num_other_users, days, seed, **options)
+
+    result = cache.get(key)
+    if result is None:
+        result = compute_metrics(user_actions, num_other_users, days, seed, **options)
+        cache.put(key, result)
+    return result
@@ -0,0 +1,207 @@
+"""Out-of-core scoring of event logs larger than memory.
+
+``compute_metrics_from_events`` needs every event in RAM at once. Here an
+event log on disk (JSONL or CSV, one event per row) is read in batches of
+``ChunkConfig.batch_size`` events. Each batch is folded into per-user,
+per-day partial strain sums, which are appended to one temp file per day.
+Days are then scored one at a time from their spill file.
+
+Peak memory is one batch plus one day's population (one float per user),
+whatever the size of the log. Partial sums are added in log order, so
+results equal the in-memory path up to float rounding, and exactly whenever
+no user-day straddles two batches.
+"""
+
+import csv
+import json
+import math
+import os
+import shutil
+import struct
+import tempfile
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .metrics_engine import (
+    Event,
+    _compute_TES_BSS_for_day,
+    _event_day,
+    _event_strain,
+    _finalize_metrics,
+    _iso_day,
+)
+
+# One spilled partial sum: user index, strain.
+_RECORD = struct.Struct("<id")
+
+
+@dataclass
+class ChunkConfig:
+    """Knobs for the out-of-core pipeline.
+
+    batch_size: events held in memory at once while reading the log.
+    temp_dir: parent directory for spill files (default: the system temp dir).
+    """
+
+    batch_size: int = 50_000
+    temp_dir: Optional[str] = None
+
+    def __post_init__(self):
+        if self.batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+
+def _parse_row(row: Dict[str, Any]) -> Event:
+    # CSV has no null: an empty cell means the column is missing for this row.
+    row = {k: v for k, v in row.items() if v != ""}
+    ts = row.get("timestamp")
+    if isinstance(ts, str):
+        try:
+            ts = float(ts)
+        except ValueError:
+            ts = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+            if ts.tzinfo is not None:
+                ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    if isinstance(ts, float) and ts.is_integer():
+        ts = int(ts)
+    return Event.from_dict({**row, "timestamp": ts})
+
+
+def _iter_rows(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_event_batches(path: str, batch_size: int = 50_000) -> Iterator[List[Event]]:
+    """Read an event log as lists of at most ``batch_size`` ``Event`` records.
+
+    JSONL files hold one object per line; ``.csv`` files need a header row.
+    Rows use the dict event keys (user_id, timestamp, action_type, amount,
+    asset); timestamps are unix seconds or ISO-8601 UTC strings.
+    """
+    batch: List[Event] = []
+    for row in _iter_rows(path):
+        batch.append(_parse_row(row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_event_log(user_events: Dict[str, List[Any]], path: str) -> int:
+    """Write ``user_events`` to a JSONL event log; returns the row count."""
+    rows = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for user, events in user_events.items():
+            for ev in events:
+                if not isinstance(ev, Event):
+                    ev = Event.from_dict(ev, user_id=user)
+                record = ev.to_dict()
+                record["user_id"] = user
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                rows += 1
+    return rows
+
+
+class _DaySpill:
+    """Per-day spill files of (user index, partial strain) records."""
+
+    def __init__(self, temp_dir: Optional[str]):
+        self.dir = tempfile.mkdtemp(prefix="metrics-spill-", dir=temp_dir)
+        self.users: List[str] = []
+        self._user_idx: Dict[str, int] = {}
+
+    def _index(self, user: str) -> int:
+        idx = self._user_idx.get(user)
+        if idx is None:
+            idx = self._user_idx[user] = len(self.users)
+            self.users.append(user)
+        return idx
+
+    def _path(self, day: int) -> str:
+        return os.path.join(self.dir, f"{day}.bin")
+
+    def add_batch(self, batch: Iterable[Event]) -> None:
+        partial: Dict[int, Dict[int, float]] = defaultdict(lambda: defaultdict(float))
+        for ev in batch:
+            partial[_event_day(ev)][self._index(ev.user_id)] += _event_strain(ev)
+        for day, sums in partial.items():
+            with open(self._path(day), "ab") as f:
+                f.write(b"".join(_RECORD.pack(i, s) for i, s in sums.items()))
+
+    def days(self) -> List[int]:
+        return sorted(int(name[:-4]) for name in os.listdir(self.dir))
+
+    def day_totals(self, day: int, batch_size: int = 50_000) -> Dict[int, float]:
+        """Per-user strain for ``day``, reading at most ``batch_size`` records at a time."""
+        totals: Dict[int, float] = defaultdict(float)
+        chunk = batch_size * _RECORD.size
+        with open(self._path(day), "rb") as f:
+            while True:
+                data = f.read(chunk)
+                if not data:
+                    break
+                for i, s in _RECORD.iter_unpack(data):
+                    totals[i] += s
+        return totals
+
+    def close(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def compute_metrics_out_of_core(
+    batches: Iterable[Iterable[Event]],
+    days: int = 14,
+    config: Optional[ChunkConfig] = None,
+) -> Dict[str, Any]:
+    """Score an iterable of event batches without holding them all in memory."""
+    config = config or ChunkConfig()
+    spill = _DaySpill(config.temp_dir)
+    try:
+        for batch in batches:
+            spill.add_batch(batch)
+
+        epoch_days = spill.days()[-days:] if days > 0 else []
+        days_list = [_iso_day(day) for day in epoch_days]
+        users = spill.users
+
+        daily_scores_by_user: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
+        for day, label in zip(epoch_days, days_list):
+            totals = spill.day_totals(day, config.batch_size)
+            daily_strain = {}
+            daily_decision = {}
+            for i, user in enumerate(users):
+                s = totals.get(i)
+                if s is None:
+                    daily_strain[user] = {}
+                    daily_decision[user] = {}
+                else:
+                    daily_strain[user] = {day: s}
+                    daily_decision[user] = {day: math.log1p(s)}
+            scores = _compute_TES_BSS_for_day(day, daily_strain, daily_decision)
+            for user, s in scores.items():
+                daily_scores_by_user[user][label] = s
+    finally:
+        spill.close()
+
+    return _finalize_metrics(daily_scores_by_user, days_list)
+
+
+def compute_metrics_from_log(
+    path: str,
+    days: int = 14,
+    config: Optional[ChunkConfig] = None,
+) -> Dict[str, Any]:
+    """``compute_metrics_from_events`` for an on-disk JSONL/CSV event log."""
+    config = config or ChunkConfig()
+    return compute_metrics_out_of_core(
+        iter_event_batches(path, config.batch_size), days=days, config=config
+    )
@@ -0,0 +1,281 @@
+"""Columnar NumPy backend for ``compute_metrics``.
+
+Events are held as parallel typed arrays (user index, epoch day, action code,
+amount) instead of one dict per event, and daily strain is built as a dense
+users x days matrix with grouped sums. Columns are filled straight from
+``Event`` attributes without a per-event Python loop, and strain uses
+NumPy's vectorized ``log1p``; results match the reference dict
+implementation in ``metrics_engine.py`` up to last-ulp rounding
+(``exact=True`` restores bit-for-bit parity at the cost of a per-value
+``math.log1p`` call).
+"""
+
+import math
+from collections import defaultdict
+from itertools import chain
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the dict backend works without it
+    np = None
+
+from .metrics_engine import (
+    ACTION_CODES,
+    ACTION_WEIGHTS,
+    OTHER_ACTION,
+    TES_EPSILON,
+    Event,
+    _event_day,
+    _finalize_metrics,
+    _iso_day,
+)
+from .profiling import NULL_PROFILER
+from .ranking import score_day_columns
+
+# Packed single-array form of EventColumns: 17 bytes per event.
+EVENT_FIELDS = [("user", "<i4"), ("day", "<i4"), ("action", "i1"), ("amount", "<f8")]
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("NumPy is required for the columnar metrics backend")
+
+
+def _weight_table(weights: Dict[str, float] = ACTION_WEIGHTS):
+    """Weight per action code, indexable by ``EventColumns.action``."""
+    table = [float(weights.get(name, 1.0)) for name in ACTION_CODES]
+    table.append(1.0)
+    return np.asarray(table, dtype=np.float64)
+
+
+def _log1p(values, exact: bool = False):
+    # NumPy's SIMD log1p can differ from libm in the last ulp, which is enough
+    # to move a TES window edge. ``exact`` keeps parity with math.log1p.
+    if exact:
+        return np.fromiter(
+            map(math.log1p, values.tolist()), dtype=np.float64, count=len(values)
+        )
+    return np.log1p(values)
+
+
+class EventColumns:
+    """One row per event, stored as parallel typed arrays.
+
+    users: user ids, in population order; ``user_idx`` indexes into it.
+    """
+
+    __slots__ = ("users", "user_idx", "day", "action", "amount")
+
+    def __init__(self, users: List[str], user_idx, day, action, amount):
+        self.users = users
+        self.user_idx = user_idx
+        self.day = day
+        self.action = action
+        self.amount = amount
+
+    def __len__(self) -> int:
+        return len(self.user_idx)
+
+    def to_records(self):
+        """Pack the columns into one structured array (``EVENT_FIELDS``)."""
+        _require_numpy()
+        records = np.empty(len(self), dtype=np.dtype(EVENT_FIELDS))
+        records["user"] = self.user_idx
+        records["day"] = self.day
+        records["action"] = self.action
+        records["amount"] = self.amount
+        return records
+
+    @classmethod
+    def from_records(cls, users: List[str], records) -> "EventColumns":
+        _require_numpy()
+        return cls(
+            users,
+            np.ascontiguousarray(records["user"], dtype=np.int32),
+            np.ascontiguousarray(records["day"], dtype=np.int32),
+            np.ascontiguousarray(records["action"], dtype=np.int8),
+            np.ascontiguousarray(records["amount"], dtype=np.float64),
+        )
+
+    @classmethod
+    def from_user_events(cls, user_events: Dict[str, List[Any]]) -> "EventColumns":
+        _require_numpy()
+        users = list(user_events.keys())
+        lengths = [len(events) for events in user_events.values()]
+        n = sum(lengths)
+        try:
+            return cls._from_event_records(users, user_events, lengths, n)
+        except AttributeError:
+            pass  # dict events somewhere in the input
+        return cls._from_mixed_events(users, user_events, n)
+
+    @classmethod
+    def _from_event_records(cls, users, user_events, lengths, n) -> "EventColumns":
+        # map() over attrgetter runs the per-event field reads in C.
+        def column(field, dtype):
+            events = chain.from_iterable(user_events.values())
+            return np.fromiter(map(attrgetter(field), events), dtype=dtype, count=n)
+
+        ts = column("ts", np.float64)
+        return cls(
+            users,
+            np.repeat(np.arange(len(users), dtype=np.int32), lengths),
+            np.floor_divide(ts, 86400).astype(np.int32),
+            column("action", np.int8),
+            column("amount", np.float64),
+        )
+
+    @classmethod
+    def _from_mixed_events(cls, users, user_events, n) -> "EventColumns":
+
+        user_idx = np.empty(n, dtype=np.int32)
+        day = np.empty(n, dtype=np.int32)
+        action = np.empty(n, dtype=np.int8)
+        amount = np.empty(n, dtype=np.float64)
+
+        pos = 0
+        for i, events in enumerate(user_events.values()):
+            k = len(events)
+            user_idx[pos : pos + k] = i
+            day[pos : pos + k] = [_event_day(ev) for ev in events]
+            action[pos : pos + k] = [
+                ev.action
+                if type(ev) is Event
+                else ACTION_CODES.get(ev.get("action_type", "other"), OTHER_ACTION)
+                for ev in events
+            ]
+            amount[pos : pos + k] = [float(ev.get("amount", 0.0)) for ev in events]
+            pos += k
+
+        return cls(users, user_idx, day, action, amount)
+
+
+def _event_strain_array(cols: EventColumns, exact: bool = False):
+    """Per-event strain: vectorized ACTION_WEIGHTS lookup times amount factor."""
+    amount_factor = 1.0 + _log1p(np.abs(cols.amount), exact) / 5.0
+    return _weight_table()[cols.action] * amount_factor
+
+
+def daily_matrices(cols: EventColumns, exact: bool = False):
+    """Dense per-user, per-day strain and decision matrices.
+
+    Returns (day_values, strain, decision) where ``day_values`` are the sorted
+    observed epoch days and both matrices have shape (len(users), len(days)).
+    """
+    _require_numpy()
+    n_users = len(cols.users)
+    day_values, day_pos = np.unique(cols.day, return_inverse=True)
+    n_days = len(day_values)
+    event_strain = _event_strain_array(cols, exact)
+
+    # bincount accumulates in input order, matching the dict path's `+=`.
+    flat = cols.user_idx.astype(np.int64) * n_days + day_pos.reshape(-1)
+    strain = np.bincount(
+        flat, weights=event_strain, minlength=n_users * n_days
+    ).reshape(n_users, n_days)
+    decision = _log1p(strain.ravel(), exact).reshape(n_users, n_days)
+    return day_values, strain, decision
+
+
+def _metrics_from_matrices(
+    users: List[str],
+    day_values,
+    strain,
+    decision,
+    days: int,
+    all_cfs: bool = False,
+    prof=NULL_PROFILER,
+):
+    # Keep the most recent `days` observed days
+    first = max(0, len(day_values) - days)
+    days_list = [_iso_day(d) for d in day_values[first:].tolist()]
+
+    with prof.stage("tes_bss") as rec:
+        rec["users"] = len(users)
+        rec["days"] = len(days_list)
+
+        daily_scores_by_user: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
+        columns: List[Tuple[str, List[float], List[float]]] = []
+        for j, day in enumerate(days_list, start=first):
+            TES, BSS = score_day_columns(decision[:, j], strain[:, j], TES_EPSILON)
+            columns.append((day, TES.tolist(), BSS.tolist()))
+
+        for i, user in enumerate(users if columns else []):
+            scores = daily_scores_by_user[user]
+            for day, TES, BSS in columns:
+                scores[day] = {"TES": TES[i], "BSS": BSS[i]}
+
+    return _finalize_metrics(daily_scores_by_user, days_list, all_cfs=all_cfs, prof=prof)
+
+
+def compute_metrics_columnar(
+    user_events: Dict[str, List[Any]],
+    days: int = 14,
+    exact: bool = False,
+    all_cfs: bool = False,
+    prof=NULL_PROFILER,
+):
+    """Columnar equivalent of ``compute_metrics_from_events``.
+
+    exact: use math.log1p for bit-for-bit parity with the dict backend (a
+    Python call per value, for parity checks); the default vectorized log1p
+    may differ in the last ulp, which can move a TES window edge.
+    """
+    with prof.stage("daily_strain") as rec:
+        cols = EventColumns.from_user_events(user_events)
+        day_values, strain, decision = daily_matrices(cols, exact=exact)
+        rec["events"] = len(cols)
+        rec["users"] = len(cols.users)
+        rec["days"] = len(day_values)
+    return _metrics_from_matrices(
+        cols.users, day_values, strain, decision, days, all_cfs=all_cfs, prof=prof
+    )
+
+
+def compute_metrics_from_batches(
+    batches: Iterable[EventColumns],
+    days: int = 14,
+    exact: bool = False,
+):
+    """Score a stream of ``EventColumns`` batches that share one population.
+
+    Only one strain column per kept day is held in memory, so the event log
+    itself can be far larger than RAM. Sums for a user-day split across
+    batches may differ from a single pass in the last ulp.
+    """
+    _require_numpy()
+    if days <= 0:
+        # No day window to keep, as in compute_metrics_columnar.
+        return _finalize_metrics({}, [])
+    users: Optional[List[str]] = None
+    window: Dict[int, Any] = {}
+
+    for batch in batches:
+        if users is None:
+            users = batch.users
+        event_strain = _event_strain_array(batch, exact)
+
+        for day in np.unique(batch.day).tolist():
+            if len(window) >= days and day < min(window):
+                continue  # older than every kept day
+            mask = batch.day == day
+            col = np.bincount(
+                batch.user_idx[mask], weights=event_strain[mask], minlength=len(users)
+            )
+            if day in window:
+                window[day] += col
+            else:
+                window[day] = col
+
+        while len(window) > days:
+            del window[min(window)]
+
+    if users is None or not window:
+        return _finalize_metrics({}, [])
+
+    day_values = np.asarray(sorted(window), dtype=np.int64)
+    strain = np.column_stack([window[d] for d in day_values.tolist()])
+    decision = _log1p(strain.ravel(), exact).reshape(strain.shape)
+    return _metrics_from_matrices(users, day_values, strain, decision, days)
@@ -0,0 +1,191 @@
+"""Map-reduce scoring for crowds split across processes or hosts.
+
+Users are assigned to shards by a stable hash of their id. Each shard maps
+its own events to a partial aggregate: per-user daily strain series plus,
+per day, the shard's sorted nonzero decisions and strains (exact mode) or
+KLL sketches of them (approx mode). Partials are plain dicts; exact ones are
+JSON-serializable as they stand, approx ones pickle.
+
+The reducer merges the per-day aggregates into the global population, with
+every user not active on a day counted as a zero, and finishes TES/BSS, BMS
+and CFS. In exact mode the result equals ``compute_metrics_from_events``
+on the unsplit events.
+"""
+
+import copy
+import heapq
+import math
+import zlib
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from .metrics_engine import (
+    TES_EPSILON,
+    _compute_daily_strain,
+    _finalize_metrics,
+    _iso_day,
+)
+from .parallel import _executor, resolve_workers
+from .ranking import window_count
+
+PARTIAL_FORMAT = 1
+
+
+def shard_of(user_id: str, n_shards: int) -> int:
+    """Stable shard index for ``user_id`` (the same on every host and run)."""
+    return zlib.crc32(user_id.encode("utf-8")) % n_shards
+
+
+def partition_events(
+    user_events: Dict[str, List[Any]], n_shards: int
+) -> List[Dict[str, List[Any]]]:
+    shards: List[Dict[str, List[Any]]] = [{} for _ in range(n_shards)]
+    for user, events in user_events.items():
+        shards[shard_of(user, n_shards)][user] = events
+    return shards
+
+
+def map_shard(
+    user_events: Dict[str, List[Any]],
+    mode: str = "exact",
+    bss_error: float = 0.01,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Partial aggregate of one shard's users.
+
+    mode: "exact" keeps sorted per-day values; "approx" keeps per-day
+    ``DaySketch``es with rank error ``bss_error``.
+    """
+    if mode not in ("exact", "approx"):
+        raise ValueError(f"Unknown map-reduce mode: {mode!r}")
+    daily_strain, daily_decision = _compute_daily_strain(user_events)
+
+    series = {
+        user: {str(day): s for day, s in strain.items()} for user, strain in daily_strain.items()
+    }
+    per_day: Dict[int, List[str]] = defaultdict(list)
+    for user, strain in daily_strain.items():
+        for day in strain:
+            per_day[day].append(user)
+
+    partial: Dict[str, Any] = {
+        "format": PARTIAL_FORMAT,
+        "mode": mode,
+        "users": len(daily_strain),
+        "series": series,
+    }
+    if mode == "exact":
+        partial["days"] = {
+            str(day): {
+                "decisions": sorted(daily_decision[u][day] for u in users),
+                "strains": sorted(daily_strain[u][day] for u in users),
+            }
+            for day, users in per_day.items()
+        }
+    else:
+        from .sketch import DaySketch
+
+        sketches = {}
+        for day, users in per_day.items():
+            sketch = DaySketch(bss_error, seed)
+            for u in users:
+                sketch.add(daily_decision[u][day], daily_strain[u][day])
+            sketches[str(day)] = sketch
+        partial["sketches"] = sketches
+    return partial
+
+
+def _merge_exact(partials: List[Dict[str, Any]], day: str):
+    entries = [p["days"][day] for p in partials if day in p["days"]]
+    decisions = list(heapq.merge(*(e["decisions"] for e in entries)))
+    strains = list(heapq.merge(*(e["strains"] for e in entries)))
+    return decisions, strains
+
+
+def _merge_sketches(partials: List[Dict[str, Any]], day: str):
+    merged = None
+    for p in partials:
+        sketch = p["sketches"].get(day)
+        if sketch is None:
+            continue
+        # Copy the first so reducing never mutates the caller's partials.
+        merged = copy.deepcopy(sketch) if merged is None else merged.merge(sketch)
+    return merged
+
+
+def reduce_partials(
+    partials: Iterable[Dict[str, Any]],
+    days: int = 14,
+    epsilon: float = TES_EPSILON,
+) -> Dict[str, Any]:
+    """Merge shard partials and finish TES/BSS, BMS and CFS."""
+    partials = list(partials)
+    modes = {p["mode"] for p in partials}
+    if len(modes) > 1:
+        raise ValueError("Cannot mix exact and approx partials")
+    if any(p.get("format") != PARTIAL_FORMAT for p in partials):
+        raise ValueError("Unsupported partial format")
+    mode = modes.pop() if modes else "exact"
+
+    n = sum(p["users"] for p in partials)
+    all_days = sorted({int(d) for p in partials for s in p["series"].values() for d in s})
+    epoch_days = all_days[-days:] if days > 0 else []
+    days_list = [_iso_day(day) for day in epoch_days]
+
+    daily_scores_by_user: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
+    for day, label in zip(epoch_days, days_list):
+        key = str(day)
+        if mode == "exact":
+            decisions, strains = _merge_exact(partials, key)
+            zeros = [0.0] * (n - len(strains))
+            # Inactive users sit at zero, below every active value.
+            sorted_decisions = zeros + decisions
+            sorted_strains = zeros + strains
+        else:
+            sketch = _merge_sketches(partials, key)
+            zero_count = n - (sketch.count if sketch else 0)
+
+        for p in partials:
+            for user, series in p["series"].items():
+                s_u = series.get(key, 0.0)
+                d_u = math.log1p(s_u)
+                if mode == "exact":
+                    tes = window_count(sorted_decisions, d_u, epsilon)
+                    bss = bisect_right(sorted_strains, s_u)
+                else:
+                    tes = (zero_count if abs(d_u) <= epsilon else 0) + (
+                        sketch.decision.count_within(d_u, epsilon) if sketch else 0.0
+                    )
+                    bss = zero_count + (sketch.strain.rank(s_u) if sketch else 0.0)
+                daily_scores_by_user[user][label] = {
+                    "TES": min(100.0, (tes / n) * 100.0),
+                    "BSS": min(100.0, (bss / n) * 100.0),
+                }
+
+    return _finalize_metrics(
+        daily_scores_by_user,
+        days_list,
+        score_mode="approx" if mode == "approx" else "exact",
+    )
+
+
+def run_local(
+    user_events: Dict[str, List[Any]],
+    n_shards: int = 4,
+    days: int = 14,
+    workers: Optional[int] = None,
+    mode: str = "exact",
+    bss_error: float = 0.01,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Partition, map each shard (on the process pool) and reduce, locally."""
+    shards = partition_events(user_events, n_shards)
+    workers = resolve_workers(workers)
+    if workers > 1:
+        pool = _executor(workers)
+        futures = [pool.submit(map_shard, shard, mode, bss_error, seed) for shard in shards]
+        partials = [f.result() for f in futures]
+    else:
+        partials = [map_shard(shard, mode, bss_error, seed) for shard in shards]
+    return reduce_partials(partials, days=days)
@@ -1,9 +1,14 @@
 import random
 import math
+import sys
 from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import date, datetime
 from typing import List, Dict, Any, Optional
 
+from .profiling import NULL_PROFILER, resolve_profiler
+from .ranking import score_day, window_range
+from .windows import BMSWindows
+
 # Action weights reflect "strain" or intensity of different behaviors.
 ACTION_WEIGHTS = {
     "buy": 2.0,
@@ -14,24 +19,40 @@ ACTION_WEIGHTS = {
     "withdraw": 2.0,
 }
 
+# Two users' decisions are "similar" for TES when within this distance.
+TES_EPSILON = 0.25
+# CFS cohort: users whose past BMS is within CFS_DELTA of the target; a
+# past -> future change beyond +/-CFS_TOL counts as improved/declined.
+CFS_DELTA = 5.0
+CFS_TOL = 3.0
+
+# Stable integer codes for action types. Anything without an explicit weight
+# maps to OTHER_ACTION and gets the default weight of 1.0.
+ACTION_CODES: Dict[str, int] = {name: i for i, name in enumerate(ACTION_WEIGHTS)}
+OTHER_ACTION = len(ACTION_CODES)
+_ACTION_NAMES = list(ACTION_CODES) + ["other"]
+_CODE_WEIGHTS = [ACTION_WEIGHTS[name] for name in ACTION_CODES] + [1.0]
+
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
 
-def _day_key(ts) -> str:
-    """Convert a datetime or timestamp to YYYY-MM-DD string."""
+def _epoch_day(ts) -> int:
+    """Bucket a datetime or unix timestamp into days since 1970-01-01 (UTC).
+
+    Days are plain ints internally; ISO strings are only built for output.
+    """
     if isinstance(ts, (int, float)):
-        dt = datetime.utcfromtimestamp(ts)
-    elif isinstance(ts, datetime):
-        dt = ts
-    else:
+        return int(ts // 86400)
+    if not isinstance(ts, datetime):
         # Fallback: now
-        dt = datetime.utcnow()
-    return dt.strftime("%Y-%m-%d")
+        ts = datetime.utcnow()
+    return ts.toordinal() - _EPOCH_ORDINAL
 
 
-def _percentile_rank(value: float, population: List[float]) -> float:
-    if not population:
-        return 0.0
-    count = sum(1 for x in population if x <= value)
-    return (count / len(population)) * 100.0
+def _iso_day(epoch_day: int) -> str:
+    """Convert an epoch day back to its YYYY-MM-DD string."""
+    return date.fromordinal(epoch_day + _EPOCH_ORDINAL).isoformat()
 
 
 def _avg_nonzero(values: List[float]) -> float:
@@ -41,110 +62,183 @@ def _avg_nonzero(values: List[float]) -> float:
     return sum(non_zero) / len(non_zero)
 
 
+class Event:
+    """One event as a compact record.
+
+    Ids are interned so a million events share a handful of strings, the
+    action type is stored as its ``ACTION_CODES`` code and ``ts`` is unix
+    seconds. Item access (``ev["timestamp"]``, ``ev.get("amount")``) mirrors
+    the dict events accepted everywhere else.
+    """
+
+    __slots__ = ("user_id", "ts", "action", "amount", "asset")
+
+    def __init__(self, user_id: str, ts: int, action: int, amount: float, asset: str = "QUBIC"):
+        self.user_id = user_id
+        self.ts = ts
+        self.action = action
+        self.amount = amount
+        self.asset = asset
+
+    @classmethod
+    def from_dict(cls, ev: Dict[str, Any], user_id: Optional[str] = None) -> "Event":
+        ts = ev.get("timestamp")
+        if isinstance(ts, datetime):
+            ts = _epoch_seconds(ts)
+        elif not isinstance(ts, (int, float)):
+            ts = _epoch_seconds(datetime.utcnow())
+        action_type = str(ev.get("action_type", "other")).lower()
+        return cls(
+            sys.intern(str(user_id if user_id is not None else ev.get("user_id", "you"))),
+            ts,
+            ACTION_CODES.get(action_type, OTHER_ACTION),
+            float(ev.get("amount", 0.0)),
+            sys.intern(str(ev.get("asset", "QUBIC"))),
+        )
+
+    @property
+    def action_type(self) -> str:
+        return _ACTION_NAMES[self.action]
+
+    @property
+    def day(self) -> int:
+        return int(self.ts // 86400)
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "timestamp":
+            return self.ts
+        if key in ("user_id", "action_type", "amount", "asset"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "timestamp": self.ts,
+            "action_type": self.action_type,
+            "amount": self.amount,
+            "asset": self.asset,
+        }
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Event):
+            return NotImplemented
+        return (self.user_id, self.ts, self.action, self.amount, self.asset) == (
+            other.user_id, other.ts, other.action, other.amount, other.asset
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"Event({self.user_id!r}, {self.ts}, {self.action_type!r}, "
+            f"{self.amount!r}, {self.asset!r})"
+        )
+
+
+def _epoch_seconds(ts: datetime) -> int:
+    """Unix seconds of a naive UTC datetime (sub-second part dropped)."""
+    day = ts.toordinal() - _EPOCH_ORDINAL
+    return day * 86400 + ts.hour * 3600 + ts.minute * 60 + ts.second
+
+
 def _build_demo_events(
     user_actions: List[Dict[str, Any]],
     num_other_users: int = 25,
     days: int = 14,
     seed: Optional[int] = None,
-) -> Dict[str, List[Dict[str, Any]]]:
+) -> Dict[str, List[Event]]:
     """Build a synthetic event dataset including the current user and other users.
 
     user_actions: list of dicts with at least action_type, amount, asset, timestamp (optional).
+    Events come back as ``Event`` records.
     """
     rng = random.Random(seed)
     user_id_you = "you"
-    user_events: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    user_events: Dict[str, List[Event]] = defaultdict(list)
 
     now = datetime.utcnow()
+    today = now.toordinal() - _EPOCH_ORDINAL
+    action_codes = list(ACTION_CODES.values())
 
     # Current user actions (treated as today)
     for act in user_actions:
         ts = act.get("timestamp") or now
         if not isinstance(ts, datetime):
             ts = now
-        action_type = str(act.get("action_type", "other")).lower()
-        amount = float(act.get("amount", 0.0))
-        asset = str(act.get("asset", "QUBIC"))
-
-        user_events[user_id_you].append(
-            {
-                "user_id": user_id_you,
-                "timestamp": ts,
-                "action_type": action_type,
-                "amount": amount,
-                "asset": asset,
-            }
-        )
+        user_events[user_id_you].append(Event.from_dict({**act, "timestamp": ts}, user_id_you))
 
     # Add some historical activity for the current user so momentum makes sense
     for day_offset in range(1, days):
         num_actions = rng.randint(0, 4)
+        day_start = (today - day_offset) * 86400
         for _ in range(num_actions):
             ts = (
-                now
-                - timedelta(days=day_offset)
-            ).replace(
-                hour=rng.randint(0, 23),
-                minute=rng.randint(0, 59),
-                second=rng.randint(0, 59),
-                microsecond=0,
+                day_start
+                + rng.randint(0, 23) * 3600
+                + rng.randint(0, 59) * 60
+                + rng.randint(0, 59)
             )
-            action_type = rng.choice(list(ACTION_WEIGHTS.keys()))
+            action = rng.choice(action_codes)
             amount = rng.uniform(5, 150)
-            user_events[user_id_you].append(
-                {
-                    "user_id": user_id_you,
-                    "timestamp": ts,
-                    "action_type": action_type,
-                    "amount": amount,
-                    "asset": "QUBIC",
-                }
-            )
+            user_events[user_id_you].append(Event(user_id_you, ts, action, amount))
 
     # Other synthetic users
     for i in range(num_other_users):
-        user_id = f"user_{i+1}"
+        user_id = sys.intern(f"user_{i+1}")
         for day_offset in range(days):
             num_actions = rng.randint(0, 6)
+            day_start = (today - day_offset) * 86400
             for _ in range(num_actions):
                 ts = (
-                    now
-                    - timedelta(days=day_offset)
-                ).replace(
-                    hour=rng.randint(0, 23),
-                    minute=rng.randint(0, 59),
-                    second=rng.randint(0, 59),
-                    microsecond=0,
+                    day_start
+                    + rng.randint(0, 23) * 3600
+                    + rng.randint(0, 59) * 60
+                    + rng.randint(0, 59)
                 )
-                action_type = rng.choice(list(ACTION_WEIGHTS.keys()))
+                action = rng.choice(action_codes)
                 amount = rng.uniform(5, 200)
-                user_events[user_id].append(
-                    {
-                        "user_id": user_id,
-                        "timestamp": ts,
-                        "action_type": action_type,
-                        "amount": amount,
-                        "asset": "QUBIC",
-                    }
-                )
+                user_events[user_id].append(Event(user_id, ts, action, amount))
     return user_events
 
 
-def _compute_daily_strain(user_events: Dict[str, List[Dict[str, Any]]]):
-    """Compute daily strain and decision intensity for each user and day."""
-    daily_strain: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
-    daily_decision: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+def _event_day(ev) -> int:
+    """Epoch day of an ``Event`` or a dict event."""
+    if type(ev) is Event:
+        return int(ev.ts // 86400)
+    return _epoch_day(ev["timestamp"])
+
+
+def _event_strain(ev) -> float:
+    """Strain contributed by a single event (an ``Event`` or a dict)."""
+    if type(ev) is Event:
+        base_weight = _CODE_WEIGHTS[ev.action]
+        amount = ev.amount
+    else:
+        action_type = ev.get("action_type", "other")
+        amount = float(ev.get("amount", 0.0))
+        base_weight = ACTION_WEIGHTS.get(action_type, 1.0)
+
+    # Mild boost for larger amounts so big trades feel "heavier"
+    amount_factor = 1.0 + math.log1p(abs(amount)) / 5.0
+    return base_weight * amount_factor
+
+
+def _compute_daily_strain(user_events: Dict[str, List[Any]]):
+    """Compute daily strain and decision intensity for each user and day.
+
+    Events may be ``Event`` records or dicts, freely mixed.
+    """
+    daily_strain: Dict[str, Dict[int, float]] = defaultdict(lambda: defaultdict(float))
+    daily_decision: Dict[str, Dict[int, float]] = defaultdict(lambda: defaultdict(float))
 
     for user, events in user_events.items():
         for ev in events:
-            day = _day_key(ev["timestamp"])
-            action_type = ev.get("action_type", "other")
-            amount = float(ev.get("amount", 0.0))
-
-            base_weight = ACTION_WEIGHTS.get(action_type, 1.0)
-            # Mild boost for larger amounts so big trades feel "heavier"
-            amount_factor = 1.0 + math.log1p(abs(amount)) / 5.0
-            daily_strain[user][day] += base_weight * amount_factor
+            daily_strain[user][_event_day(ev)] += _event_strain(ev)
 
         # Decision score: smoothed transform of strain
         for day, s in daily_strain[user].items():
@@ -154,31 +248,40 @@ def _compute_daily_strain(user_events: Dict[str, List[Dict[str, Any]]]):
 
 
 def _compute_TES_BSS_for_day(
-    day: str,
-    daily_strain: Dict[str, Dict[str, float]],
-    daily_decision: Dict[str, Dict[str, float]],
+    day: int,
+    daily_strain: Dict[str, Dict[int, float]],
+    daily_decision: Dict[str, Dict[int, float]],
+    epsilon: float = TES_EPSILON,
+    sketch=None,
 ):
+    """TES/BSS for every user in ``daily_strain`` on one day.
+
+    sketch: optional ``sketch.DaySketch`` of the (possibly wider) population;
+    when given, windows and ranks are estimated from it instead of exact.
+    """
     users = list(daily_strain.keys())
+    if sketch is not None:
+        if sketch.strain.max_value <= 0:
+            return {u: {"TES": 0.0, "BSS": 0.0} for u in users}
+        n = sketch.count
+        scores = {}
+        for u in users:
+            d_u = daily_decision[u].get(day, 0.0)
+            s_u = daily_strain[u].get(day, 0.0)
+            TES = min(100.0, (sketch.decision.count_within(d_u, epsilon) / n) * 100.0)
+            BSS = min(100.0, (sketch.strain.rank(s_u) / n) * 100.0)
+            scores[u] = {"TES": TES, "BSS": BSS}
+        return scores
+
     all_decisions = [daily_decision[u].get(day, 0.0) for u in users]
     all_strains = [daily_strain[u].get(day, 0.0) for u in users]
 
     if sum(all_strains) == 0:
         return {u: {"TES": 0.0, "BSS": 0.0} for u in users}
 
-    epsilon = 0.25
-    scores = {}
-
-    for u in users:
-        d_u = daily_decision[u].get(day, 0.0)
-        s_u = daily_strain[u].get(day, 0.0)
-
-        similar = sum(1 for d in all_decisions if abs(d - d_u) <= epsilon)
-        TES = (similar / len(all_decisions)) * 100.0
-        BSS = _percentile_rank(s_u, all_strains)
-
-        scores[u] = {"TES": TES, "BSS": BSS}
-
-    return scores
+    # Sort once per day, then binary-search each user's window and rank.
+    TES, BSS = score_day(all_decisions, all_strains, epsilon)
+    return {u: {"TES": t, "BSS": b} for u, t, b in zip(users, TES, BSS)}
 
 
 def _compute_BMS(
@@ -221,26 +324,55 @@ def _compute_BMS(
     return BMS
 
 
-def _compute_CFS(
-    BMS_history: Dict[str, Dict[str, float]],
-    target_user: str = "you",
-):
-    users = list(BMS_history.keys())
-    if target_user not in BMS_history:
-        if not users:
-            return {}
-        target_user = users[0]
+def _trend_class(history: Dict[str, float], tol: float) -> int:
+    """0 = improved, 1 = stable, 2 = declined between past and future BMS."""
+    diff = history["future"] - history["past"]
+    if diff > tol:
+        return 0
+    if diff < -tol:
+        return 2
+    return 1
 
-    target_past = BMS_history[target_user]["past"]
-    delta = 5.0
 
-    cohort = [
-        u
-        for u in users
-        if u != target_user and abs(BMS_history[u]["past"] - target_past) <= delta
-    ]
+class _CohortIndex:
+    """Users sorted by past BMS, with prefix counts of each trend class.
 
-    if not cohort:
+    A +/-delta cohort is two binary searches and its improved/stable/declined
+    split is three prefix differences, so CFS for every user is O(U log U).
+    """
+
+    def __init__(self, BMS_history: Dict[str, Dict[str, float]], tol: float = CFS_TOL):
+        self.tol = tol
+        ordered = sorted(
+            (h["past"], _trend_class(h, tol)) for h in BMS_history.values()
+        )
+        self.pasts = [past for past, _ in ordered]
+        self.prefix = [[0, 0, 0]]
+        for _, cls in ordered:
+            row = list(self.prefix[-1])
+            row[cls] += 1
+            self.prefix.append(row)
+
+    @classmethod
+    def from_sorted(
+        cls, pasts: List[float], prefix: List[List[int]], tol: float = CFS_TOL
+    ) -> "_CohortIndex":
+        """Rebuild an index from its ``pasts`` and ``prefix`` (e.g. loaded from disk)."""
+        index = cls.__new__(cls)
+        index.tol = tol
+        index.pasts = pasts
+        index.prefix = prefix
+        return index
+
+    def counts(self, past: float, delta: float) -> List[int]:
+        """Improved/stable/declined counts for users within delta of ``past``."""
+        lo, hi = window_range(self.pasts, past, delta)
+        return [self.prefix[hi][c] - self.prefix[lo][c] for c in range(3)]
+
+
+def _cfs_entry(target_user: str, counts: List[int]) -> Dict[str, Any]:
+    n = sum(counts)
+    if not n:
         return {
             "target_user": target_user,
             "cohort_size": 0,
@@ -248,22 +380,7 @@ def _compute_CFS(
             "Stable%": 0.0,
             "Decline%": 0.0,
         }
-
-    improved = 0
-    stable = 0
-    declined = 0
-    TOL = 3.0
-
-    for u in cohort:
-        diff = BMS_history[u]["future"] - BMS_history[u]["past"]
-        if diff > TOL:
-            improved += 1
-        elif diff < -TOL:
-            declined += 1
-        else:
-            stable += 1
-
-    n = len(cohort)
+    improved, stable, declined = counts
     return {
         "target_user": target_user,
         "cohort_size": n,
@@ -273,67 +390,247 @@ def _compute_CFS(
     }
 
 
+def _cohort_counts(
+    index: _CohortIndex, history: Dict[str, float], delta: float
+) -> List[int]:
+    counts = index.counts(history["past"], delta)
+    # The cohort excludes the user themselves.
+    counts[_trend_class(history, index.tol)] -= 1
+    return counts
+
+
+def _compute_CFS(
+    BMS_history: Dict[str, Dict[str, float]],
+    target_user: str = "you",
+    delta: float = CFS_DELTA,
+    tol: float = CFS_TOL,
+):
+    users = list(BMS_history.keys())
+    if target_user not in BMS_history:
+        if not users:
+            return {}
+        target_user = users[0]
+
+    index = _CohortIndex(BMS_history, tol)
+    return _cfs_entry(
+        target_user, _cohort_counts(index, BMS_history[target_user], delta)
+    )
+
+
+def _compute_CFS_all(
+    BMS_history: Dict[str, Dict[str, float]],
+    delta: float = CFS_DELTA,
+    tol: float = CFS_TOL,
+) -> Dict[str, Dict[str, Any]]:
+    """CFS for every user from one shared cohort index."""
+    index = _CohortIndex(BMS_history, tol)
+    return {
+        user: _cfs_entry(user, _cohort_counts(index, history, delta))
+        for user, history in BMS_history.items()
+    }
+
+
+def _compute_BMS_history(
+    daily_scores_by_user: Dict[str, Dict[str, Dict[str, float]]],
+    days_list: List[str],
+) -> Dict[str, Dict[str, float]]:
+    """Real past/future BMS per user: first vs second half of ``days_list``."""
+    return BMSWindows(daily_scores_by_user, days_list).history()
+
+
+def _finalize_metrics(
+    daily_scores_by_user: Dict[str, Dict[str, Dict[str, float]]],
+    days_list: List[str],
+    workers: int = 1,
+    score_mode: str = "exact",
+    all_cfs: bool = False,
+    prof=NULL_PROFILER,
+):
+    """Shared tail of every backend: BMS, BMS history and CFS."""
+    with prof.stage("bms") as rec:
+        if workers > 1:
+            from .parallel import compute_BMS_parallel
+
+            BMS_scores = compute_BMS_parallel(daily_scores_by_user, days_list, workers)
+        else:
+            BMS_scores = _compute_BMS(daily_scores_by_user, days_list)
+        rec["users"] = len(BMS_scores)
+        rec["days"] = len(days_list)
+
+    with prof.stage("cfs") as rec:
+        BMS_history = _compute_BMS_history(daily_scores_by_user, days_list)
+        cfs_result = _compute_CFS(BMS_history, target_user="you")
+        cfs_all = _compute_CFS_all(BMS_history) if all_cfs else None
+        rec["users"] = len(BMS_history)
+
+    result = {
+        "target_user": "you",
+        "days": days_list,
+        "daily_scores": daily_scores_by_user,
+        "BMS": BMS_scores,
+        "CFS": cfs_result,
+        "score_mode": score_mode,
+    }
+    if cfs_all is not None:
+        result["CFS_all"] = cfs_all
+    return result
+
+
+def _score_events(
+    user_events: Dict[str, List[Any]],
+    days: int,
+    seed: Optional[int],
+    backend: str,
+    workers: Optional[int],
+    bss_error: Optional[float],
+    all_cfs: bool,
+    prof,
+):
+    if bss_error is not None and backend != "python":
+        raise ValueError("Approximate scoring is only available on the python backend")
+    if backend == "numpy":
+        from .columnar import compute_metrics_columnar
+
+        return compute_metrics_columnar(user_events, days=days, all_cfs=all_cfs, prof=prof)
+    if backend != "python":
+        raise ValueError(f"Unknown metrics backend: {backend!r}")
+
+    from .parallel import resolve_workers
+
+    workers = resolve_workers(workers)
+
+    with prof.stage("daily_strain") as rec:
+        daily_strain, daily_decision = _compute_daily_strain(user_events)
+
+        # Collect all observed days and keep the most recent `days` of them
+        all_days = sorted({day for strain in daily_strain.values() for day in strain})
+        if len(all_days) > days:
+            epoch_days = all_days[-days:]
+        else:
+            epoch_days = all_days
+        # Output keeps the YYYY-MM-DD format; convert once per day, not per event.
+        days_list = [_iso_day(day) for day in epoch_days]
+        if prof.enabled:
+            rec["events"] = sum(len(events) for events in user_events.values())
+            rec["users"] = len(daily_strain)
+            rec["days"] = len(all_days)
+
+    with prof.stage("tes_bss") as rec:
+        rec["users"] = len(daily_strain)
+        rec["days"] = len(epoch_days)
+
+        sketches = None
+        if bss_error is not None:
+            from .sketch import build_day_sketches
+
+            sketches = build_day_sketches(
+                daily_strain, daily_decision, epoch_days, epsilon=bss_error, seed=seed
+            )
+            workers = 1
+
+        if workers > 1 and len(days_list) > 1:
+            from .parallel import score_days_parallel
+
+            daily_scores_by_user = score_days_parallel(
+                epoch_days, daily_strain, daily_decision, workers, labels=days_list
+            )
+        else:
+            daily_scores_by_user = defaultdict(dict)
+            for day, label in zip(epoch_days, days_list):
+                scores = _compute_TES_BSS_for_day(
+                    day,
+                    daily_strain,
+                    daily_decision,
+                    sketch=sketches[day] if sketches else None,
+                )
+                for user, s in scores.items():
+                    daily_scores_by_user[user][label] = s
+
+    return _finalize_metrics(
+        daily_scores_by_user,
+        days_list,
+        workers=workers,
+        score_mode="approx" if sketches else "exact",
+        all_cfs=all_cfs,
+        prof=prof,
+    )
+
+
+def _attach_profile(result: Dict[str, Any], prof) -> Dict[str, Any]:
+    if prof.enabled:
+        result["_profile"] = prof.emit()
+    return result
+
+
+def compute_metrics_from_events(
+    user_events: Dict[str, List[Any]],
+    days: int = 14,
+    seed: Optional[int] = None,
+    backend: str = "python",
+    workers: Optional[int] = None,
+    bss_error: Optional[float] = None,
+    all_cfs: bool = False,
+    profile=None,
+):
+    """Score an already-built event dataset.
+
+    user_events: user id -> events, as ``Event`` records or dicts.
+    backend: "python" (reference dict implementation) or "numpy" (columnar
+    engine in ``metrics_engine.columnar``). Both return the same dict shape;
+    numpy scores can differ from python at last-ulp TES window edges.
+    workers: processes for day scoring and BMS (python backend); None reads
+    ``CROWDLIKE_METRICS_WORKERS`` (default 1), 0 uses every core.
+    bss_error: if set, score TES/BSS approximately against per-day KLL
+    sketches with this rank error (e.g. 0.01); ``score_mode`` says which.
+    all_cfs: also return ``CFS_all``, the CFS of every user keyed by user id.
+    profile: True or a ``profiling.StageProfiler`` to record per-stage timings
+    under ``_profile``; off by default.
+    """
+    prof = resolve_profiler(profile)
+    result = _score_events(
+        user_events, days, seed, backend, workers, bss_error, all_cfs, prof
+    )
+    return _attach_profile(result, prof)
+
+
 def compute_metrics(
     user_actions: Optional[List[Dict[str, Any]]] = None,
     num_other_users: int = 25,
     days: int = 14,
     seed: Optional[int] = None,
+    backend: str = "python",
+    workers: Optional[int] = None,
+    bss_error: Optional[float] = None,
+    all_cfs: bool = False,
+    profile=None,
 ):
     """High-level entry point used by the Streamlit app.
 
     user_actions: list of actions for the logged-in user in the current demo session.
+    backend, workers, bss_error, all_cfs, profile: see ``compute_metrics_from_events``.
     Returns a dict with:
         - target_user
         - days
         - daily_scores
         - BMS
         - CFS
+        - score_mode ("exact" or "approx")
+        - _profile (only when profiling is on)
     """
     if user_actions is None:
         user_actions = []
 
-    user_events = _build_demo_events(
-        user_actions, num_other_users=num_other_users, days=days, seed=seed
-    )
-    daily_strain, daily_decision = _compute_daily_strain(user_events)
-
-    # Collect all observed days and keep the most recent `days` of them
-    all_days = sorted(
-        {
-            _day_key(ev["timestamp"])
-            for events in user_events.values()
-            for ev in events
-        }
-    )
-    if len(all_days) > days:
-        days_list = all_days[-days:]
-    else:
-        days_list = all_days
-
-    daily_scores_by_user: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
-
-    for day in days_list:
-        scores = _compute_TES_BSS_for_day(day, daily_strain, daily_decision)
-        for user, s in scores.items():
-            daily_scores_by_user[user][day] = s
-
-    BMS_scores = _compute_BMS(daily_scores_by_user, days_list)
-
-    # Create simple past/future BMS history with random noise
-    rng = random.Random(seed)
-    BMS_history: Dict[str, Dict[str, float]] = {}
-    for user, info in BMS_scores.items():
-        base = info["BMS%"]
-        past = base + rng.uniform(-5, 5)
-        future = base + rng.uniform(-5, 5)
-        BMS_history[user] = {"past": past, "future": future}
-
-    cfs_result = _compute_CFS(BMS_history, target_user="you")
+    prof = resolve_profiler(profile)
+    with prof.stage("generate") as rec:
+        user_events = _build_demo_events(
+            user_actions, num_other_users=num_other_users, days=days, seed=seed
+        )
+        if prof.enabled:
+            rec["events"] = sum(len(events) for events in user_events.values())
+            rec["users"] = len(user_events)
+            rec["days"] = days
 
-    return {
-        "target_user": "you",
-        "days": days_list,
-        "daily_scores": daily_scores_by_user,
-        "BMS": BMS_scores,
-        "CFS": cfs_result,
-    }
+    result = _score_events(
+        user_events, days, seed, backend, workers, bss_error, all_cfs, prof
+    )
+    return _attach_profile(result, prof)
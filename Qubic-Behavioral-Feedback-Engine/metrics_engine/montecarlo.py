@@ -0,0 +1,131 @@
+"""Monte Carlo spread of BMS and CFS across synthetic crowds.
+
+A single ``compute_metrics`` run reports one crowd draw. Here many draws run
+across the shared process pool, each from its own seed derived from a base
+seed and the run index, so results do not depend on the worker count or on
+how runs are batched. Summaries are yielded after every batch so a UI can
+show convergence, and sampling stops once the confidence interval of every
+tracked mean is narrower than ``tolerance``.
+"""
+
+import hashlib
+import math
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .metrics_engine import compute_metrics
+from .parallel import _executor, _split, resolve_workers
+
+METRICS = ("BMS%", "Consistency%", "Trend%", "Improve%", "Stable%", "Decline%")
+# Two-sided 95% normal quantile for the interval around each mean.
+_Z = 1.959963984540054
+
+
+def run_seed(base_seed: int, run: int) -> int:
+    """Seed of run ``run``: a stable 63-bit hash of (base_seed, run)."""
+    digest = hashlib.sha256(f"{base_seed}:{run}".encode("ascii")).digest()
+    return int.from_bytes(digest[:8], "big") >> 1
+
+
+def _run_chunk(
+    user_actions: List[Dict[str, Any]],
+    num_other_users: int,
+    days: int,
+    seeds: Sequence[int],
+) -> List[Dict[str, float]]:
+    out = []
+    for seed in seeds:
+        result = compute_metrics(user_actions, num_other_users, days, seed=seed, workers=1)
+        sample = dict(result["BMS"].get("you", {}))
+        sample.update({k: result["CFS"].get(k, 0.0) for k in ("Improve%", "Stable%", "Decline%")})
+        out.append({name: float(sample.get(name, 0.0)) for name in METRICS})
+    return out
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    # Linear interpolation between closest ranks (NumPy's default).
+    if len(sorted_vals) == 1:
+        return sorted_vals[0]
+    pos = (len(sorted_vals) - 1) * q / 100.0
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+
+def summarize(
+    samples: Dict[str, List[float]], interval: Tuple[float, float] = (2.5, 97.5)
+) -> Dict[str, Dict[str, float]]:
+    """Mean, std, percentile interval and mean CI half-width per metric."""
+    out = {}
+    for name, values in samples.items():
+        n = len(values)
+        mean = sum(values) / n
+        var = sum((v - mean) ** 2 for v in values) / (n - 1) if n > 1 else 0.0
+        std = math.sqrt(var)
+        ordered = sorted(values)
+        out[name] = {
+            "mean": mean,
+            "std": std,
+            "p_lo": _percentile(ordered, interval[0]),
+            "p_hi": _percentile(ordered, interval[1]),
+            "ci_half_width": _Z * std / math.sqrt(n) if n > 1 else math.inf,
+        }
+    return out
+
+
+def iter_monte_carlo(
+    user_actions: Optional[List[Dict[str, Any]]] = None,
+    num_other_users: int = 25,
+    days: int = 14,
+    seed: int = 0,
+    max_runs: int = 200,
+    min_runs: int = 20,
+    tolerance: float = 1.0,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    interval: Tuple[float, float] = (2.5, 97.5),
+) -> Iterator[Dict[str, Any]]:
+    """Yield a running summary after each batch of runs.
+
+    tolerance: stop once every metric's 95% CI half-width (in percentage
+    points) is at most this, after at least ``min_runs`` runs.
+    workers: as in ``compute_metrics``; each batch is split across them.
+    batch_size: runs per batch (default: 4 per worker).
+    """
+    workers = resolve_workers(workers)
+    batch_size = batch_size or 4 * workers
+    user_actions = list(user_actions or [])
+    samples: Dict[str, List[float]] = {name: [] for name in METRICS}
+
+    done = 0
+    while done < max_runs:
+        seeds = [run_seed(seed, i) for i in range(done, min(done + batch_size, max_runs))]
+        if workers > 1 and len(seeds) > 1:
+            pool = _executor(workers)
+            futures = [
+                pool.submit(_run_chunk, user_actions, num_other_users, days, chunk)
+                for chunk in _split(seeds, workers)
+            ]
+            results = [r for f in futures for r in f.result()]
+        else:
+            results = _run_chunk(user_actions, num_other_users, days, seeds)
+
+        for r in results:
+            for name in METRICS:
+                samples[name].append(r[name])
+        done += len(seeds)
+
+        summary = summarize(samples, interval)
+        converged = done >= min_runs and all(
+            s["ci_half_width"] <= tolerance for s in summary.values()
+        )
+        yield {"runs": done, "metrics": summary, "converged": converged}
+        if converged:
+            return
+
+
+def monte_carlo_metrics(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+    """Run ``iter_monte_carlo`` to completion and return its last summary."""
+    summary: Dict[str, Any] = {}
+    for summary in iter_monte_carlo(*args, **kwargs):
+        pass
+    return summary
@@ -0,0 +1,132 @@
+"""Process-pool helpers for scoring large crowds on several cores.
+
+Days are independent once daily strain is built, so day scoring is split into
+contiguous slices of day columns; each worker receives only its own columns,
+never the whole nested strain dict. BMS is sharded by user the same way.
+"""
+
+import atexit
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .metrics_engine import TES_EPSILON, _compute_BMS
+from .ranking import score_day
+
+# Default worker count when callers pass workers=None; 0 means "all cores".
+WORKERS_ENV = "CROWDLIKE_METRICS_WORKERS"
+
+# One pool per worker count, created on first use and kept until exit: a
+# pool is never shut down while another thread may still submit to it.
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    """Effective worker count from the argument or ``CROWDLIKE_METRICS_WORKERS``."""
+    if workers is None:
+        try:
+            workers = int(os.environ.get(WORKERS_ENV, "1"))
+        except ValueError:
+            workers = 1
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    # Reused across Streamlit reruns and shared by concurrent sessions.
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _split(items: Sequence, parts: int) -> List[Sequence]:
+    """Contiguous, near-equal slices so results concatenate back in order."""
+    size, extra = divmod(len(items), parts)
+    out, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            out.append(items[start:end])
+        start = end
+    return out
+
+
+def _score_day_columns(
+    columns: Sequence[Tuple[List[float], List[float]]], epsilon: float
+) -> List[Tuple[List[float], List[float]]]:
+    out = []
+    for decisions, strains in columns:
+        if sum(strains) == 0:
+            zeros = [0.0] * len(strains)
+            out.append((zeros, zeros))
+        else:
+            out.append(score_day(decisions, strains, epsilon))
+    return out
+
+
+def score_days_parallel(
+    days_list: List[int],
+    daily_strain: Dict[str, Dict[int, float]],
+    daily_decision: Dict[str, Dict[int, float]],
+    workers: int,
+    epsilon: float = TES_EPSILON,
+    labels: Optional[List[str]] = None,
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Per-day TES/BSS for every user, with days spread across ``workers``.
+
+    labels: output keys for ``days_list`` (defaults to the days themselves).
+    """
+    users = list(daily_strain.keys())
+    columns = [
+        (
+            [daily_decision[u].get(day, 0.0) for u in users],
+            [daily_strain[u].get(day, 0.0) for u in users],
+        )
+        for day in days_list
+    ]
+
+    pool = _executor(workers)
+    futures = [
+        pool.submit(_score_day_columns, chunk, epsilon)
+        for chunk in _split(columns, workers)
+    ]
+    scored = [col for f in futures for col in f.result()]
+
+    daily_scores_by_user: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
+    for day, (TES, BSS) in zip(labels or days_list, scored):
+        for user, t, b in zip(users, TES, BSS):
+            daily_scores_by_user[user][day] = {"TES": t, "BSS": b}
+    return daily_scores_by_user
+
+
+def compute_BMS_parallel(
+    daily_scores_by_user: Dict[str, Dict[str, Dict[str, float]]],
+    days_list: List[str],
+    workers: int,
+) -> Dict[str, Dict[str, float]]:
+    """``_compute_BMS`` sharded by user across ``workers``."""
+    items = list(daily_scores_by_user.items())
+    pool = _executor(workers)
+    futures = [
+        pool.submit(_compute_BMS, dict(shard), days_list)
+        for shard in _split(items, workers)
+    ]
+    BMS: Dict[str, Dict[str, float]] = {}
+    for f in futures:
+        BMS.update(f.result())
+    return BMS
@@ -0,0 +1,157 @@
+"""Opt-in per-stage instrumentation for ``compute_metrics``.
+
+Pass ``profile=True`` (or a ``StageProfiler``) to ``compute_metrics`` to get
+wall time, CPU time, event/user/day counts and tracemalloc peak for each of
+generate, daily_strain, tes_bss, bms and cfs. The report comes back under the
+result's ``_profile`` key and is handed to every configured sink.
+
+With profiling off the engine uses ``NULL_PROFILER``, whose stages are a
+no-op context manager.
+
+tracemalloc is process-global, so memory-traced stages of concurrent runs
+take turns behind ``_TRACE_LOCK``; untraced stages run freely.
+"""
+
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+Sink = Callable[[Dict[str, Any]], None]
+
+logger = logging.getLogger("metrics_engine.profile")
+
+# Reentrant so a traced stage may open another on the same thread.
+_TRACE_LOCK = threading.RLock()
+
+
+class _Stage:
+    __slots__ = ("_profiler", "name", "record", "_wall", "_cpu", "_tracing")
+
+    def __init__(self, profiler: "StageProfiler", name: str):
+        self._profiler = profiler
+        self.name = name
+        self.record: Dict[str, Any] = {"stage": name}
+
+    def __enter__(self) -> Dict[str, Any]:
+        self._tracing = False
+        if self._profiler.trace_memory:
+            _TRACE_LOCK.acquire()
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc) -> None:
+        self.record["wall_s"] = time.perf_counter() - self._wall
+        self.record["cpu_s"] = time.process_time() - self._cpu
+        if self._profiler.trace_memory:
+            self.record["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            if self._tracing:
+                tracemalloc.stop()
+            _TRACE_LOCK.release()
+        self._profiler.stages.append(self.record)
+
+
+class StageProfiler:
+    """Collects one record per stage; ``report()`` summarizes them.
+
+    trace_memory: record tracemalloc peaks (slows the traced stages down).
+    sinks: callables that receive the report when ``emit()`` is called.
+    """
+
+    enabled = True
+
+    def __init__(self, trace_memory: bool = True, sinks: Optional[List[Sink]] = None):
+        self.trace_memory = trace_memory
+        self.sinks: List[Sink] = list(sinks or [])
+        self.stages: List[Dict[str, Any]] = []
+
+    def stage(self, name: str) -> _Stage:
+        """Context manager timing ``name``; the yielded dict takes extra counts."""
+        return _Stage(self, name)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "stages": list(self.stages),
+            "wall_s": sum(s["wall_s"] for s in self.stages),
+            "cpu_s": sum(s["cpu_s"] for s in self.stages),
+        }
+
+    def emit(self) -> Dict[str, Any]:
+        report = self.report()
+        for sink in self.sinks:
+            try:
+                sink(report)
+            except Exception:
+                # A broken sink must never break a metrics run
+                logger.exception("profile sink failed")
+        return report
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self) -> Dict[str, Any]:
+        return {}
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+class _NullProfiler:
+    enabled = False
+    _stage = _NullStage()
+
+    def stage(self, name: str) -> _NullStage:
+        return self._stage
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+def log_sink(report: Dict[str, Any]) -> None:
+    """Sink writing one JSON log line per run to ``metrics_engine.profile``."""
+    logger.info("metrics profile %s", json.dumps(report, separators=(",", ":")))
+
+
+class ProfileRegistry:
+    """In-process sink keeping the most recent reports (thread-safe)."""
+
+    def __init__(self, maxlen: int = 100):
+        self._reports: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def __call__(self, report: Dict[str, Any]) -> None:
+        with self._lock:
+            self._reports.append(report)
+
+    def recent(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._reports)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reports.clear()
+
+
+PROFILE_REGISTRY = ProfileRegistry()
+
+
+def resolve_profiler(profile) -> Any:
+    """Map ``compute_metrics``'s ``profile`` argument to a profiler.
+
+    True profiles into ``PROFILE_REGISTRY``; pass a ``StageProfiler`` to pick
+    sinks (e.g. ``log_sink``) or turn off memory tracing.
+    """
+    if profile is None or profile is False:
+        return NULL_PROFILER
+    if profile is True:
+        return StageProfiler(sinks=[PROFILE_REGISTRY])
+    return profile
@@ -0,0 +1,188 @@
+"""Day/week/month rollups of daily scores for long-horizon BMS.
+
+``_compute_BMS`` walks every day of the window for every user, so a
+year-long view costs 25x a two-week one. ``MetricRollups`` keeps each
+user's daily TES/BSS (with nonzero-day counts) and strain/decision totals at
+three granularities, updated incrementally as days are scored. A window is
+covered greedily by whole months, then whole ISO weeks, then single days, so
+a 365-day BMS reads a few dozen buckets rather than 365 days.
+
+Windows are calendar ranges of epoch days: days with no scores count as
+inactive, like days with zero BSS in ``_compute_BMS``.
+"""
+
+import math
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .metrics_engine import _EPOCH_ORDINAL, _iso_day
+
+LEVELS = ("day", "week", "month")
+# Bucket fields: TES sum, TES nonzero days, BSS sum, BSS nonzero days,
+# strain sum, decision sum.
+_FIELDS = 6
+
+
+def _week_key(day: int) -> int:
+    # Epoch day 0 was a Thursday; weeks start on Monday.
+    return (day + 3) // 7
+
+
+def _week_start(key: int) -> int:
+    return key * 7 - 3
+
+
+def _month_key(day: int) -> int:
+    d = date.fromordinal(day + _EPOCH_ORDINAL)
+    return d.year * 12 + d.month - 1
+
+
+def _month_start(key: int) -> int:
+    return date(key // 12, key % 12 + 1, 1).toordinal() - _EPOCH_ORDINAL
+
+
+def _cover(start: int, end: int) -> Iterator[Tuple[int, int]]:
+    """(level index, bucket key) pairs exactly tiling epoch days [start, end)."""
+    day = start
+    while day < end:
+        month = _month_key(day)
+        if _month_start(month) == day and _month_start(month + 1) <= end:
+            yield 2, month
+            day = _month_start(month + 1)
+            continue
+        week = _week_key(day)
+        if _week_start(week) == day and day + 7 <= end:
+            yield 1, week
+            day += 7
+            continue
+        yield 0, day
+        day += 1
+
+
+class MetricRollups:
+    """Per-user score buckets at day, week and month level."""
+
+    def __init__(self):
+        # user -> one {bucket key -> fields} dict per level
+        self._levels: Dict[str, Tuple[Dict[int, List[float]], ...]] = {}
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any], daily_strain=None) -> "MetricRollups":
+        """Rollups of a ``compute_metrics`` result's ``daily_scores``."""
+        rollups = cls()
+        rollups.update_scores(result["daily_scores"], daily_strain)
+        return rollups
+
+    @property
+    def users(self) -> List[str]:
+        return list(self._levels)
+
+    def update(
+        self,
+        user: str,
+        day: int,
+        TES: float,
+        BSS: float,
+        strain: float = 0.0,
+        decision: float = 0.0,
+    ) -> None:
+        """Set ``user``'s scores for epoch ``day``, replacing earlier ones."""
+        levels = self._levels.get(user)
+        if levels is None:
+            levels = self._levels[user] = ({}, {}, {})
+        new = [TES, 1.0 if TES > 0 else 0.0, BSS, 1.0 if BSS > 0 else 0.0, strain, decision]
+        old = levels[0].get(day)
+        delta = new if old is None else [n - o for n, o in zip(new, old)]
+        levels[0][day] = new
+        for level, key in ((1, _week_key(day)), (2, _month_key(day))):
+            bucket = levels[level].get(key)
+            if bucket is None:
+                levels[level][key] = list(delta)
+            else:
+                for i in range(_FIELDS):
+                    bucket[i] += delta[i]
+
+    def update_scores(
+        self,
+        daily_scores_by_user: Dict[str, Dict[str, Dict[str, float]]],
+        daily_strain: Optional[Dict[str, Dict[int, float]]] = None,
+    ) -> None:
+        """Bulk ``update`` from ISO-labelled daily scores (and epoch-day strain)."""
+        days: Dict[str, int] = {}
+        for user, scores in daily_scores_by_user.items():
+            strain = daily_strain.get(user, {}) if daily_strain else {}
+            for label, s in scores.items():
+                day = days.get(label)
+                if day is None:
+                    day = days[label] = date.fromisoformat(label).toordinal() - _EPOCH_ORDINAL
+                s_u = strain.get(day, 0.0)
+                self.update(user, day, s["TES"], s["BSS"], s_u, math.log1p(s_u))
+
+    def _sum(self, user: str, start: int, end: int) -> List[float]:
+        total = [0.0] * _FIELDS
+        levels = self._levels.get(user)
+        if levels is None:
+            return total
+        for level, key in _cover(start, end):
+            fields = levels[level].get(key)
+            if fields is not None:
+                for i in range(_FIELDS):
+                    total[i] += fields[i]
+        return total
+
+    def totals(self, user: str, start: int, end: int) -> Dict[str, float]:
+        """Summed fields over epoch days [start, end)."""
+        total = self._sum(user, start, end)
+        return {
+            "TES": total[0],
+            "TES_days": total[1],
+            "BSS": total[2],
+            "active_days": total[3],
+            "strain": total[4],
+            "decision": total[5],
+        }
+
+    def bms(self, user: str, start: int, end: int) -> Dict[str, float]:
+        """BMS over epoch days [start, end), as ``_compute_BMS`` scores it."""
+        width = end - start
+        if width <= 0:
+            return {"Consistency%": 0.0, "Trend%": 50.0, "BMS%": 25.0}
+        mid = start + max(1, width // 2)
+        past = self._sum(user, start, mid)
+        recent = self._sum(user, mid, end)
+
+        def avg(fields: List[float]) -> float:
+            tes = fields[0] / fields[1] if fields[1] else 0.0
+            bss = fields[2] / fields[3] if fields[3] else 0.0
+            return (tes + bss) / 2.0
+
+        consistency = ((past[3] + recent[3]) / width) * 100.0
+        trend = max(0.0, min(100.0, 50.0 + avg(recent) - avg(past)))
+        return {
+            "Consistency%": consistency,
+            "Trend%": trend,
+            "BMS%": 0.5 * consistency + 0.5 * trend,
+        }
+
+    def series(self, user: str, level: str, start: int, end: int) -> List[Dict[str, Any]]:
+        """Bucket rows of one level overlapping [start, end), oldest first."""
+        idx = LEVELS.index(level)
+        key_of = (lambda d: d, _week_key, _month_key)[idx]
+        start_of = (lambda k: k, _week_start, _month_start)[idx]
+        levels = self._levels.get(user)
+        rows = []
+        if levels is None or end <= start:
+            return rows
+        for key in range(key_of(start), key_of(end - 1) + 1):
+            fields = levels[idx].get(key)
+            if fields is not None:
+                rows.append(
+                    {
+                        "start": _iso_day(start_of(key)),
+                        "TES": fields[0],
+                        "BSS": fields[2],
+                        "active_days": fields[3],
+                        "strain": fields[4],
+                    }
+                )
+        return rows
@@ -0,0 +1,158 @@
+"""Mergeable quantile sketches for approximate TES/BSS over huge populations.
+
+Exact BSS ranks every user against every other user's strain for the day,
+which needs the whole population in memory. A KLL sketch keeps
+O(k log(n/k)) samples instead and answers rank queries with an additive
+error of about ``epsilon * n``. Sketches built on separate shards merge into
+one with the same guarantee.
+"""
+
+import math
+import random
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional
+
+# Normalized rank error of KLL is roughly 3.3 / k (DataSketches' k=200 -> 1.65%).
+_ERROR_CONSTANT = 3.3
+
+
+class KLLSketch:
+    """KLL quantile sketch over floats.
+
+    epsilon: target rank error as a fraction of the count (0.01 = 1 percentile).
+    seed: seeds the compaction coin flips, for reproducible sketches.
+    """
+
+    def __init__(self, epsilon: float = 0.01, seed: Optional[int] = None):
+        if not 0.0 < epsilon < 1.0:
+            raise ValueError("epsilon must be between 0 and 1")
+        self.epsilon = epsilon
+        self.k = max(8, math.ceil(_ERROR_CONSTANT / epsilon))
+        self.count = 0
+        self.max_value = -math.inf
+        self._levels: List[List[float]] = [[]]
+        self._rng = random.Random(seed)
+        self._sorted: Optional[List[List[float]]] = None
+
+    def _capacity(self, level: int) -> int:
+        height = len(self._levels) - level - 1
+        return math.ceil(self.k * (2.0 / 3.0) ** height) + 1
+
+    def _retained(self) -> int:
+        return sum(len(items) for items in self._levels)
+
+    def _max_retained(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self._levels)))
+
+    def update(self, value: float) -> None:
+        self._levels[0].append(value)
+        self.count += 1
+        if value > self.max_value:
+            self.max_value = value
+        self._sorted = None
+        if len(self._levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def update_many(self, values: Iterable[float]) -> None:
+        for v in values:
+            self.update(v)
+
+    def _compress(self) -> None:
+        while self._retained() >= self._max_retained():
+            for h, items in enumerate(self._levels):
+                if len(items) >= self._capacity(h):
+                    if h + 1 == len(self._levels):
+                        self._levels.append([])
+                    items.sort()
+                    # Keep every other item (random phase) at double weight;
+                    # an odd leftover stays behind at this level.
+                    keep_last = items.pop() if len(items) % 2 else None
+                    offset = self._rng.randint(0, 1)
+                    self._levels[h + 1].extend(items[offset::2])
+                    items.clear()
+                    if keep_last is not None:
+                        items.append(keep_last)
+                    break
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Fold ``other`` into this sketch (in place) and return self."""
+        while len(self._levels) < len(other._levels):
+            self._levels.append([])
+        for h, items in enumerate(other._levels):
+            self._levels[h].extend(items)
+        self.count += other.count
+        self.max_value = max(self.max_value, other.max_value)
+        self._sorted = None
+        self._compress()
+        return self
+
+    def _sorted_levels(self) -> List[List[float]]:
+        if self._sorted is None:
+            self._sorted = [sorted(items) for items in self._levels]
+        return self._sorted
+
+    def rank(self, value: float) -> float:
+        """Estimated number of values ``<= value``."""
+        return float(
+            sum(bisect_right(items, value) << h for h, items in enumerate(self._sorted_levels()))
+        )
+
+    def rank_below(self, value: float) -> float:
+        """Estimated number of values ``< value``."""
+        return float(
+            sum(bisect_left(items, value) << h for h, items in enumerate(self._sorted_levels()))
+        )
+
+    def count_within(self, center: float, radius: float) -> float:
+        """Estimated number of values with ``abs(x - center) <= radius``."""
+        return max(0.0, self.rank(center + radius) - self.rank_below(center - radius))
+
+
+class DaySketch:
+    """Decision and strain sketches for one day of the population."""
+
+    def __init__(self, epsilon: float = 0.01, seed: Optional[int] = None):
+        self.decision = KLLSketch(epsilon, seed)
+        self.strain = KLLSketch(epsilon, None if seed is None else seed + 1)
+
+    @property
+    def count(self) -> int:
+        return self.strain.count
+
+    def add(self, decision: float, strain: float) -> None:
+        self.decision.update(decision)
+        self.strain.update(strain)
+
+    def merge(self, other: "DaySketch") -> "DaySketch":
+        self.decision.merge(other.decision)
+        self.strain.merge(other.strain)
+        return self
+
+
+def build_day_sketches(
+    daily_strain: Dict[str, Dict[int, float]],
+    daily_decision: Dict[str, Dict[int, float]],
+    days: Iterable[int],
+    epsilon: float = 0.01,
+    seed: Optional[int] = None,
+) -> Dict[int, DaySketch]:
+    """One ``DaySketch`` per day over the users of this shard."""
+    sketches: Dict[int, DaySketch] = {}
+    for day in days:
+        sketch = DaySketch(epsilon, seed)
+        for user, strain in daily_strain.items():
+            sketch.add(daily_decision[user].get(day, 0.0), strain.get(day, 0.0))
+        sketches[day] = sketch
+    return sketches
+
+
+def merge_day_sketches(shards: Iterable[Dict[int, DaySketch]]) -> Dict[int, DaySketch]:
+    """Merge per-shard day sketches into population-wide ones."""
+    merged: Dict[int, DaySketch] = {}
+    for shard in shards:
+        for day, sketch in shard.items():
+            if day in merged:
+                merged[day].merge(sketch)
+            else:
+                merged[day] = sketch
+    return merged
@@ -0,0 +1,173 @@
+"""Parameter sweeps over ACTION_WEIGHTS, the TES epsilon and the CFS cohort.
+
+Re-running ``compute_metrics`` per combination regenerates the crowd and
+re-aggregates every event each time. A sweep builds the events once and
+reduces them to per-user, per-day, per-action amount-factor sums; strain
+under any weight vector is then a dot product with those sums. Intermediates
+are shared down the grid:
+
+* per weight vector: daily strain/decision and BSS (BSS ignores epsilon)
+* per epsilon: TES, BMS and the past/future BMS history
+* per tol: the cohort index; per delta: one cohort lookup
+
+Strain sums are regrouped by action, so values match ``compute_metrics`` up
+to float rounding.
+"""
+
+import math
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .metrics_engine import (
+    ACTION_CODES,
+    ACTION_WEIGHTS,
+    CFS_DELTA,
+    CFS_TOL,
+    OTHER_ACTION,
+    TES_EPSILON,
+    Event,
+    _build_demo_events,
+    _cfs_entry,
+    _CohortIndex,
+    _cohort_counts,
+    _compute_BMS,
+    _event_day,
+    _iso_day,
+)
+from .ranking import window_count
+from .windows import BMSWindows
+
+_N_CODES = OTHER_ACTION + 1
+
+
+def _action_code(ev) -> int:
+    if type(ev) is Event:
+        return ev.action
+    return ACTION_CODES.get(ev.get("action_type", "other"), OTHER_ACTION)
+
+
+def _amount_factor_sums(user_events: Dict[str, List[Any]]):
+    """user -> {epoch day -> amount-factor sum per action code}."""
+    sums: Dict[str, Dict[int, List[float]]] = {}
+    for user, events in user_events.items():
+        per_day: Dict[int, List[float]] = defaultdict(lambda: [0.0] * _N_CODES)
+        for ev in events:
+            amount = float(ev.get("amount", 0.0))
+            per_day[_event_day(ev)][_action_code(ev)] += 1.0 + math.log1p(abs(amount)) / 5.0
+        sums[user] = per_day
+    return sums
+
+
+def _weight_vector(weights: Dict[str, float]) -> List[float]:
+    merged = {**ACTION_WEIGHTS, **weights}
+    return [float(merged[name]) for name in ACTION_CODES] + [1.0]
+
+
+def _day_scores(
+    decisions: List[float], strains: List[float], epsilons: Sequence[float]
+) -> Dict[float, tuple]:
+    """epsilon -> (TES list, BSS list) for one day; BSS is shared."""
+    n = len(strains)
+    if sum(strains) == 0:
+        zeros = [0.0] * n
+        return {eps: (zeros, zeros) for eps in epsilons}
+    sorted_strains = sorted(strains)
+    BSS = [(bisect_right(sorted_strains, s) / n) * 100.0 for s in strains]
+    sorted_decisions = sorted(decisions)
+    return {
+        eps: ([(window_count(sorted_decisions, d, eps) / n) * 100.0 for d in decisions], BSS)
+        for eps in epsilons
+    }
+
+
+def run_sweep(
+    user_events: Dict[str, List[Any]],
+    weights_grid: Optional[List[Dict[str, float]]] = None,
+    epsilons: Iterable[float] = (TES_EPSILON,),
+    deltas: Iterable[float] = (CFS_DELTA,),
+    tols: Iterable[float] = (CFS_TOL,),
+    days: int = 14,
+    target_user: str = "you",
+) -> List[Dict[str, Any]]:
+    """Score every combination of the grid over one event dataset.
+
+    weights_grid: overrides merged into ``ACTION_WEIGHTS``, one per run
+    (default: just the stock weights); keys must be ``ACTION_WEIGHTS`` names.
+    Returns one flat row per (weights, epsilon, tol, delta) with the target
+    user's BMS and CFS, in that nesting order.
+    """
+    weights_grid = weights_grid or [{}]
+    for weights in weights_grid:
+        unknown = sorted(set(weights) - set(ACTION_WEIGHTS))
+        if unknown:
+            raise ValueError(f"Unknown action weights: {', '.join(unknown)}")
+    epsilons, deltas, tols = list(epsilons), list(deltas), list(tols)
+
+    factors = _amount_factor_sums(user_events)
+    users = list(factors)
+    all_days = sorted({day for per_day in factors.values() for day in per_day})
+    epoch_days = all_days[-days:] if days > 0 else []
+    days_list = [_iso_day(day) for day in epoch_days]
+    if target_user not in factors and users:
+        target_user = users[0]
+
+    rows: List[Dict[str, Any]] = []
+    for w_index, weights in enumerate(weights_grid):
+        w = _weight_vector(weights)
+        by_eps: Dict[float, Dict[str, Dict[str, Dict[str, float]]]] = {
+            eps: {u: {} for u in users} for eps in epsilons
+        }
+        for day, label in zip(epoch_days, days_list):
+            strains = []
+            for u in users:
+                f = factors[u].get(day)
+                strains.append(sum(wi * fi for wi, fi in zip(w, f)) if f else 0.0)
+            decisions = [math.log1p(s) for s in strains]
+            for eps, (TES, BSS) in _day_scores(decisions, strains, epsilons).items():
+                scores = by_eps[eps]
+                for u, t, b in zip(users, TES, BSS):
+                    scores[u][label] = {"TES": t, "BSS": b}
+
+        weight_cols = {f"weight_{name}": w[code] for name, code in ACTION_CODES.items()}
+        for eps in epsilons:
+            daily_scores = by_eps[eps]
+            BMS = _compute_BMS({target_user: daily_scores[target_user]}, days_list)[target_user]
+            history = BMSWindows(daily_scores, days_list).history()
+            for tol in tols:
+                index = _CohortIndex(history, tol)
+                for delta in deltas:
+                    cfs = _cfs_entry(
+                        target_user, _cohort_counts(index, history[target_user], delta)
+                    )
+                    rows.append(
+                        {
+                            "weights": w_index,
+                            **weight_cols,
+                            "epsilon": eps,
+                            "tol": tol,
+                            "delta": delta,
+                            "user": target_user,
+                            **BMS,
+                            **{k: v for k, v in cfs.items() if k != "target_user"},
+                        }
+                    )
+    return rows
+
+
+def sweep_metrics(
+    user_actions: Optional[List[Dict[str, Any]]] = None,
+    num_other_users: int = 25,
+    days: int = 14,
+    seed: Optional[int] = None,
+    **grid: Any,
+) -> List[Dict[str, Any]]:
+    """``run_sweep`` over the synthetic crowd ``compute_metrics`` would build.
+
+    grid: ``weights_grid``, ``epsilons``, ``deltas`` and ``tols`` as in ``run_sweep``.
+    """
+    user_events = _build_demo_events(
+        user_actions or [], num_other_users=num_other_users, days=days, seed=seed
+    )
+    return run_sweep(user_events, days=days, **grid)
+
@@ -0,0 +1,145 @@
+"""Vectorized synthetic crowd generator.
+
+``_build_demo_events`` draws every event with its own ``rng`` calls and keeps
+one Python record per event. This generator draws whole days at once into
+``EventColumns`` batches and can yield them lazily, so a crowd far larger
+than RAM can be fed straight into ``compute_metrics_from_batches``.
+
+It follows the same recipe as ``_build_demo_events`` (0-4 history actions a
+day for "you", 0-6 for everyone else, uniform amounts) but uses NumPy's
+generator, so the population differs from the dict path for a given seed.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; see _require_numpy
+    np = None
+
+from .columnar import (
+    ACTION_CODES,
+    OTHER_ACTION,
+    EventColumns,
+    _require_numpy,
+    compute_metrics_from_batches,
+)
+from .metrics_engine import _epoch_day
+
+
+def _crowd_users(num_other_users: int) -> List[str]:
+    return ["you"] + [f"user_{i+1}" for i in range(num_other_users)]
+
+
+def _user_action_columns(user_actions: List[Dict[str, Any]], today: int):
+    day, action, amount = [], [], []
+    for act in user_actions:
+        ts = act.get("timestamp")
+        day.append(_epoch_day(ts) if isinstance(ts, datetime) else today)
+        action_type = str(act.get("action_type", "other")).lower()
+        action.append(ACTION_CODES.get(action_type, OTHER_ACTION))
+        amount.append(float(act.get("amount", 0.0)))
+    return day, action, amount
+
+
+def iter_crowd_batches(
+    user_actions: Optional[List[Dict[str, Any]]] = None,
+    num_other_users: int = 25,
+    days: int = 14,
+    seed: Optional[int] = None,
+    chunk_days: int = 1,
+    today: Optional[int] = None,
+) -> Iterator[EventColumns]:
+    """Yield the synthetic crowd as ``EventColumns``, ``chunk_days`` days per batch.
+
+    Batches run oldest day first. Each day draws from its own child stream of
+    ``seed``, so the population does not depend on ``chunk_days``.
+    today: epoch day of the most recent day (defaults to the current UTC day).
+    """
+    _require_numpy()
+    if today is None:
+        today = _epoch_day(datetime.utcnow())
+
+    users = _crowd_users(num_other_users)
+    n_users = len(users)
+    day_streams = np.random.SeedSequence(seed).spawn(days)
+    max_actions = np.full(n_users, 6, dtype=np.int64)
+    max_actions[0] = 4
+    max_amount = np.full(n_users, 200.0)
+    max_amount[0] = 150.0
+
+    parts: List[EventColumns] = []
+    for day_offset in range(days - 1, -1, -1):
+        rng = np.random.default_rng(day_streams[day_offset])
+        counts = rng.integers(0, max_actions + 1)
+        if day_offset == 0:
+            counts[0] = 0  # today's activity for "you" comes from user_actions
+        user_idx = np.repeat(np.arange(n_users, dtype=np.int32), counts)
+        n = len(user_idx)
+
+        action = rng.integers(0, len(ACTION_CODES), size=n).astype(np.int8)
+        amount = rng.uniform(5.0, max_amount[user_idx])
+        day = np.full(n, today - day_offset, dtype=np.int32)
+
+        if day_offset == 0 and user_actions:
+            extra_day, extra_action, extra_amount = _user_action_columns(user_actions, today)
+            user_idx = np.concatenate([np.zeros(len(extra_day), dtype=np.int32), user_idx])
+            day = np.concatenate([np.asarray(extra_day, dtype=np.int32), day])
+            action = np.concatenate([np.asarray(extra_action, dtype=np.int8), action])
+            amount = np.concatenate([np.asarray(extra_amount, dtype=np.float64), amount])
+
+        parts.append(EventColumns(users, user_idx, day, action, amount))
+        if len(parts) == chunk_days or day_offset == 0:
+            yield _concat(parts)
+            parts = []
+
+
+def _empty(num_other_users: int) -> EventColumns:
+    return EventColumns(
+        _crowd_users(num_other_users),
+        np.empty(0, dtype=np.int32),
+        np.empty(0, dtype=np.int32),
+        np.empty(0, dtype=np.int8),
+        np.empty(0, dtype=np.float64),
+    )
+
+
+def _concat(parts: List[EventColumns]) -> EventColumns:
+    if len(parts) == 1:
+        return parts[0]
+    return EventColumns(
+        parts[0].users,
+        np.concatenate([p.user_idx for p in parts]),
+        np.concatenate([p.day for p in parts]),
+        np.concatenate([p.action for p in parts]),
+        np.concatenate([p.amount for p in parts]),
+    )
+
+
+def build_crowd_columns(
+    user_actions: Optional[List[Dict[str, Any]]] = None,
+    num_other_users: int = 25,
+    days: int = 14,
+    seed: Optional[int] = None,
+    today: Optional[int] = None,
+) -> EventColumns:
+    """The whole synthetic crowd as a single ``EventColumns`` table."""
+    batches = iter_crowd_batches(
+        user_actions, num_other_users, days, seed, chunk_days=max(days, 1), today=today
+    )
+    return _concat(list(batches) or [_empty(num_other_users)])
+
+
+def compute_synthetic_metrics(
+    user_actions: Optional[List[Dict[str, Any]]] = None,
+    num_other_users: int = 25,
+    days: int = 14,
+    seed: Optional[int] = None,
+    chunk_days: int = 1,
+):
+    """``compute_metrics`` over a streamed, vectorized synthetic crowd."""
+    batches = iter_crowd_batches(
+        user_actions, num_other_users, days, seed, chunk_days=chunk_days
+    )
+    return compute_metrics_from_batches(batches, days=days)
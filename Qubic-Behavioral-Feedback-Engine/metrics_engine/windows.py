@@ -0,0 +1,124 @@
+"""BMS over arbitrary day windows from per-user prefix sums.
+
+``_compute_BMS`` walks a user's whole day list every time. ``BMSWindows``
+keeps running sums of TES, BSS and their nonzero-day counts along the day
+axis, so the BMS of any [start, end) window is a handful of subtractions.
+It backs the real past/future BMS history behind CFS and the dashboards'
+window queries.
+"""
+
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+Day = Union[int, str]
+
+_ZERO = {"TES": 0.0, "BSS": 0.0}
+
+
+def _prefix(values: List[float]) -> List[float]:
+    return list(accumulate(values, initial=0.0))
+
+
+def _window_avg(sums: List[float], counts: List[int], lo: int, hi: int) -> float:
+    # Matches _avg_nonzero: zero days add nothing to the sum or the count.
+    n = counts[hi] - counts[lo]
+    if not n:
+        return 0.0
+    return (sums[hi] - sums[lo]) / n
+
+
+class BMSWindows:
+    """Prefix sums of one scoring run, indexed by user and day position.
+
+    daily_scores_by_user / days_list: as in a ``compute_metrics`` result.
+    """
+
+    def __init__(
+        self,
+        daily_scores_by_user: Dict[str, Dict[str, Dict[str, float]]],
+        days_list: List[str],
+    ):
+        self.days = list(days_list)
+        # user -> (TES sums, TES nonzero counts, BSS sums, BSS nonzero counts)
+        self._prefix: Dict[str, Tuple[List[float], List[int], List[float], List[int]]] = {}
+        for user, day_scores in daily_scores_by_user.items():
+            TES_series = []
+            BSS_series = []
+            for day in self.days:
+                entry = day_scores.get(day, _ZERO)
+                TES_series.append(entry["TES"])
+                BSS_series.append(entry["BSS"])
+            self._prefix[user] = (
+                _prefix(TES_series),
+                list(accumulate((x > 0 for x in TES_series), initial=0)),
+                _prefix(BSS_series),
+                list(accumulate((x > 0 for x in BSS_series), initial=0)),
+            )
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any]) -> "BMSWindows":
+        return cls(result["daily_scores"], result["days"])
+
+    @property
+    def users(self) -> List[str]:
+        return list(self._prefix)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def _position(self, day: Optional[Day], default: int) -> int:
+        if day is None:
+            return default
+        if isinstance(day, str):
+            return bisect_left(self.days, day)
+        return max(0, min(len(self.days), day if day >= 0 else len(self.days) + day))
+
+    def bms_window(
+        self, user: str, start: Optional[Day] = None, end: Optional[Day] = None
+    ) -> Dict[str, float]:
+        """BMS of ``user`` over days [start, end), computed like ``_compute_BMS``.
+
+        start/end: positions in ``days`` (negative counts from the end) or
+        YYYY-MM-DD labels; None means the first / past-the-last day.
+        """
+        lo = self._position(start, 0)
+        hi = max(lo, self._position(end, len(self.days)))
+        TES_sum, TES_nz, BSS_sum, BSS_nz = self._prefix[user]
+
+        width = hi - lo
+        consistency = ((BSS_nz[hi] - BSS_nz[lo]) / width) * 100.0 if width else 0.0
+        if width:
+            mid = lo + max(1, width // 2)
+            past_avg = (
+                _window_avg(TES_sum, TES_nz, lo, mid) + _window_avg(BSS_sum, BSS_nz, lo, mid)
+            ) / 2.0
+            recent_avg = (
+                _window_avg(TES_sum, TES_nz, mid, hi) + _window_avg(BSS_sum, BSS_nz, mid, hi)
+            ) / 2.0
+            raw_trend = recent_avg - past_avg
+        else:
+            raw_trend = 0.0
+
+        trend = max(0.0, min(100.0, 50.0 + raw_trend))
+        return {
+            "Consistency%": consistency,
+            "Trend%": trend,
+            "BMS%": 0.5 * consistency + 0.5 * trend,
+        }
+
+    def history(self) -> Dict[str, Dict[str, float]]:
+        """Past/future BMS per user: the first and second half of the days.
+
+        With fewer than two days both halves are the whole range.
+        """
+        n = len(self.days)
+        mid = n // 2 if n >= 2 else n
+        future_start = mid if n >= 2 else 0
+        return {
+            user: {
+                "past": self.bms_window(user, 0, mid)["BMS%"],
+                "future": self.bms_window(user, future_start, n)["BMS%"],
+            }
+            for user in self._prefix
+        }
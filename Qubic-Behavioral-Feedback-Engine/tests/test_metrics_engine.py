@@ -0,0 +1,555 @@
+from datetime import datetime
+
+import pytest
+
+from metrics_engine import compute_metrics, compute_metrics_from_events
+from metrics_engine.metrics_engine import _build_demo_events
+
+USER_ACTIONS = [
+    {"action_type": "buy", "amount": 25.0, "asset": "QUBIC"},
+    {"action_type": "stake", "amount": 120.0, "asset": "QUBIC"},
+]
+
+
+def _demo_events(num_other_users=40, days=14, seed=7):
+    return _build_demo_events(
+        USER_ACTIONS, num_other_users=num_other_users, days=days, seed=seed
+    )
+
+
+def _epoch_day_of(label):
+    from metrics_engine.metrics_engine import _epoch_day
+
+    return _epoch_day(datetime.fromisoformat(label))
+
+
+def test_compute_metrics_shape():
+    result = compute_metrics(USER_ACTIONS, num_other_users=10, days=7, seed=3)
+    assert result["target_user"] == "you"
+    assert len(result["days"]) <= 7
+    assert set(result["BMS"]["you"]) == {"Consistency%", "Trend%", "BMS%"}
+    assert result["CFS"]["target_user"] == "you"
+
+
+def test_columnar_backend_matches_python():
+    pytest.importorskip("numpy")
+    from metrics_engine.columnar import compute_metrics_columnar
+
+    events = _demo_events()
+    expected = compute_metrics_from_events(events, days=10, seed=7)
+    assert compute_metrics_columnar(events, days=10, exact=True) == expected
+    fast = compute_metrics_from_events(events, days=10, seed=7, backend="numpy")
+    assert fast["days"] == expected["days"]
+    for user, scores in expected["daily_scores"].items():
+        for day, s in scores.items():
+            assert fast["daily_scores"][user][day] == pytest.approx(s, abs=100.0 / len(events))
+
+    # Dict events take the slower per-event path to the same columns.
+    as_dicts = {u: [ev.to_dict() for ev in evs] for u, evs in events.items()}
+    assert compute_metrics_columnar(as_dicts, days=10, exact=True) == expected
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        compute_metrics_from_events({}, backend="fortran")
+
+
+def _linear_scores(decisions, strains, epsilon=0.25):
+    # The original O(U^2) scan, kept as the reference for the sorted path.
+    n = len(decisions)
+    TES = [(sum(1 for d in decisions if abs(d - du) <= epsilon) / n) * 100.0 for du in decisions]
+    BSS = [(sum(1 for s in strains if s <= su) / n) * 100.0 for su in strains]
+    return TES, BSS
+
+
+@pytest.mark.parametrize("n", [7, 300])
+def test_sorted_day_scoring_matches_linear_scan(n, monkeypatch):
+    import random
+
+    from metrics_engine import ranking
+
+    rng = random.Random(n)
+    # Quarter steps put many pairs exactly on the epsilon boundary.
+    decisions = [rng.choice([0.0, 0.25, 0.5, 0.75, 1.0]) + rng.random() * 1e-12 for _ in range(n)]
+    decisions += [0.1, 0.35, 0.6]
+    strains = [rng.choice([0.0, 1.5, 3.0]) for _ in range(len(decisions))]
+
+    expected = _linear_scores(decisions, strains)
+    assert ranking.score_day(decisions, strains) == expected
+    monkeypatch.setattr(ranking, "np", None)
+    assert ranking.score_day(decisions, strains) == expected
+
+
+@pytest.mark.parametrize("n", [7, 300])
+def test_day_scoring_rejects_non_finite_values(n, monkeypatch):
+    import math
+
+    from metrics_engine import ranking
+
+    decisions = [0.1 * i for i in range(n)]
+    decisions[1] = math.nan
+    strains = [1.0] * n
+    with pytest.raises(ValueError):
+        ranking.score_day(decisions, strains)
+    monkeypatch.setattr(ranking, "np", None)
+    with pytest.raises(ValueError):
+        ranking.score_day(decisions, strains)
+
+
+def test_window_bounds_never_cross_on_nan():
+    np = pytest.importorskip("numpy")
+    from metrics_engine.ranking import _window_bounds
+
+    centers = np.array([0.1, np.nan, 0.5, 0.7, 0.2, 0.3])
+    lo, hi = _window_bounds(np.sort(centers), centers, 0.25)
+    assert (hi >= lo).all()
+
+
+def test_streaming_engine_matches_full_recompute():
+    from metrics_engine import MetricsEngine
+
+    events = _demo_events(num_other_users=15)
+    engine = MetricsEngine.from_user_events(events, days=10, seed=7)
+    assert engine.snapshot() == compute_metrics_from_events(events, days=10, seed=7)
+
+    # One more trade only rescores today, and still matches a rebuild.
+    today = events["you"][0]["timestamp"]
+    trade = {"user_id": "user_3", "timestamp": today, "action_type": "swap", "amount": 80.0}
+    engine.ingest(trade)
+    events["user_3"].append(trade)
+    assert engine.snapshot() == compute_metrics_from_events(events, days=10, seed=7)
+
+
+def test_parallel_workers_match_serial(monkeypatch):
+    events = _demo_events(num_other_users=30)
+    expected = compute_metrics_from_events(events, days=10, seed=7, workers=1)
+    assert compute_metrics_from_events(events, days=10, seed=7, workers=2) == expected
+
+    from metrics_engine.parallel import WORKERS_ENV, resolve_workers
+
+    monkeypatch.setenv(WORKERS_ENV, "3")
+    assert resolve_workers(None) == 3
+    assert resolve_workers(2) == 2
+
+
+def test_parallel_concurrent_callers_share_pools():
+    from concurrent.futures import ThreadPoolExecutor
+
+    events = _demo_events(num_other_users=30)
+    expected = compute_metrics_from_events(events, days=10, seed=7, workers=1)
+    with ThreadPoolExecutor(max_workers=4) as callers:
+        futures = [
+            callers.submit(compute_metrics_from_events, events, 10, 7, workers=2 + i % 2)
+            for i in range(8)
+        ]
+        assert all(f.result() == expected for f in futures)
+
+
+def test_epoch_day_round_trips_to_iso():
+    from datetime import datetime
+
+    from metrics_engine.metrics_engine import _epoch_day, _iso_day
+
+    ts = datetime(2024, 2, 29, 23, 59, 59)
+    assert _iso_day(_epoch_day(ts)) == "2024-02-29"
+    assert _iso_day(_epoch_day(1709251199.5)) == "2024-02-29"
+    assert _iso_day(_epoch_day(-1)) == "1969-12-31"
+
+
+def test_vectorized_crowd_is_deterministic_and_chunk_independent():
+    pytest.importorskip("numpy")
+    from metrics_engine.columnar import compute_metrics_from_batches
+    from metrics_engine.synthetic import build_crowd_columns, iter_crowd_batches
+
+    kwargs = dict(num_other_users=50, days=9, seed=21, today=20000)
+    a = build_crowd_columns(USER_ACTIONS, **kwargs)
+    b = build_crowd_columns(USER_ACTIONS, **kwargs)
+    assert (a.amount == b.amount).all() and (a.user_idx == b.user_idx).all()
+    assert sorted(set(a.day.tolist())) == list(range(20000 - 8, 20001))
+
+    daily = list(iter_crowd_batches(USER_ACTIONS, chunk_days=1, **kwargs))
+    weekly = list(iter_crowd_batches(USER_ACTIONS, chunk_days=7, **kwargs))
+    assert len(daily) == 9 and len(weekly) == 2
+    assert compute_metrics_from_batches(daily, days=9) == compute_metrics_from_batches(
+        weekly, days=9
+    )
+    from metrics_engine.columnar import compute_metrics_columnar
+
+    assert compute_metrics_from_batches(daily, days=0) == compute_metrics_columnar(
+        {"you": []}, days=0
+    )
+
+
+def test_kll_sketch_rank_error_and_merge():
+    import random
+
+    from metrics_engine.sketch import KLLSketch
+
+    rng = random.Random(5)
+    values = [rng.expovariate(0.2) for _ in range(20000)]
+    shards = [KLLSketch(epsilon=0.02, seed=i) for i in range(4)]
+    for i, v in enumerate(values):
+        shards[i % 4].update(v)
+    merged = shards[0]
+    for other in shards[1:]:
+        merged.merge(other)
+
+    assert merged.count == len(values)
+    ordered = sorted(values)
+    for q in (0.1, 0.5, 0.9):
+        probe = ordered[int(q * len(values))]
+        exact = sum(1 for v in values if v <= probe)
+        assert abs(merged.rank(probe) - exact) <= 0.02 * len(values)
+
+
+def test_approximate_scores_are_flagged_and_close():
+    events = _demo_events(num_other_users=200)
+    exact = compute_metrics_from_events(events, days=5, seed=7)
+    approx = compute_metrics_from_events(events, days=5, seed=7, bss_error=0.01)
+    assert exact["score_mode"] == "exact" and approx["score_mode"] == "approx"
+    for user, by_day in exact["daily_scores"].items():
+        for day, s in by_day.items():
+            assert abs(approx["daily_scores"][user][day]["BSS"] - s["BSS"]) <= 2.0
+
+
+def _linear_cfs(history, target, delta=5.0, tol=3.0):
+    cohort = [u for u in history if u != target and abs(history[u]["past"] - history[target]["past"]) <= delta]
+    diffs = [history[u]["future"] - history[u]["past"] for u in cohort]
+    return (
+        len(cohort),
+        sum(1 for d in diffs if d > tol),
+        sum(1 for d in diffs if d < -tol),
+    )
+
+
+def test_indexed_cfs_matches_linear_cohort_scan():
+    import random
+
+    from metrics_engine.metrics_engine import _compute_CFS, _compute_CFS_all
+
+    rng = random.Random(9)
+    history = {}
+    for i in range(400):
+        past = rng.choice([40.0, 45.0, 50.0, 52.5]) + rng.choice([0.0, rng.random()])
+        history[f"user_{i}"] = {"past": past, "future": past + rng.uniform(-8, 8)}
+
+    all_cfs = _compute_CFS_all(history)
+    for user in list(history)[:60]:
+        n, improved, declined = _linear_cfs(history, user)
+        cfs = all_cfs[user]
+        assert cfs == _compute_CFS(history, target_user=user)
+        assert cfs["cohort_size"] == n
+        assert cfs["Improve%"] == ((improved / n) * 100.0 if n else 0.0)
+        assert cfs["Decline%"] == ((declined / n) * 100.0 if n else 0.0)
+
+
+def test_metrics_cache_hits_evicts_and_skips_unseeded():
+    from metrics_engine.cache import MetricsCache, cached_compute_metrics
+
+    cache = MetricsCache(max_entries=2)
+    first = cached_compute_metrics(USER_ACTIONS, 5, 5, seed=1, cache=cache)
+    # Same content in a fresh list (and different key order) is a hit.
+    again = cached_compute_metrics([dict(reversed(list(a.items()))) for a in USER_ACTIONS], 5, 5, seed=1, cache=cache)
+    assert again == first and again is not first
+
+    cached_compute_metrics(USER_ACTIONS, 5, 5, seed=2, cache=cache)
+    cached_compute_metrics(USER_ACTIONS, 5, 5, seed=3, cache=cache)
+    cached_compute_metrics(USER_ACTIONS, 5, 5, seed=None, cache=cache)
+
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 3
+    assert stats["evictions"] == 1 and stats["entries"] == 2
+    assert stats["uncacheable"] == 1
+
+
+def test_metrics_cache_hands_out_private_copies():
+    from metrics_engine.cache import MetricsCache, cached_compute_metrics
+
+    cache = MetricsCache()
+    first = cached_compute_metrics(USER_ACTIONS, 5, 5, seed=1, cache=cache)
+    expected = cached_compute_metrics(USER_ACTIONS, 5, 5, seed=1, cache=cache)
+    expected["daily_scores"]["ghost"]
+    expected["BMS"]["you"]["BMS%"] = -1.0
+    # workers does not change the result, so it shares the entry.
+    again = cached_compute_metrics(USER_ACTIONS, 5, 5, seed=1, cache=cache, workers=2)
+    assert again == first and "ghost" not in again["daily_scores"]
+
+    profiled = cached_compute_metrics(USER_ACTIONS, 5, 5, seed=1, cache=cache, profile=True)
+    assert "_profile" in profiled and "_profile" not in again
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["uncacheable"] == 1
+
+
+def test_benchmark_smoke_profile_reports_every_stage():
+    from benchmarks.bench_metrics_engine import run_benchmark
+
+    report = run_benchmark([25], [7], ["python"], max_cells=None)
+    (run,) = report["runs"]
+    assert set(run["stages"]) == {"generate", "daily_strain", "tes_bss", "bms", "cfs"}
+    assert run["events"] > 0 and run["peak_bytes"] > 0
+
+
+def test_profile_reports_stages_and_feeds_sinks():
+    from metrics_engine.profiling import ProfileRegistry, StageProfiler
+
+    registry = ProfileRegistry()
+    profiler = StageProfiler(sinks=[registry])
+    result = compute_metrics(USER_ACTIONS, 10, 7, seed=3, profile=profiler)
+
+    stages = [s["stage"] for s in result["_profile"]["stages"]]
+    assert stages == ["generate", "daily_strain", "tes_bss", "bms", "cfs"]
+    assert all(s["peak_bytes"] > 0 and s["wall_s"] >= 0 for s in result["_profile"]["stages"])
+    assert registry.recent() == [result["_profile"]]
+    assert "_profile" not in compute_metrics(USER_ACTIONS, 10, 7, seed=3)
+
+
+def test_concurrent_profiled_runs_keep_memory_tracing_intact():
+    import tracemalloc
+    from concurrent.futures import ThreadPoolExecutor
+
+    from metrics_engine import compute_metrics
+
+    def run(seed):
+        return compute_metrics(USER_ACTIONS, 10, 7, seed=seed, profile=True)["_profile"]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        reports = list(pool.map(run, range(8)))
+    assert all(s["peak_bytes"] > 0 for r in reports for s in r["stages"])
+    assert not tracemalloc.is_tracing()
+
+
+def test_compact_events_score_like_dicts():
+    from metrics_engine.metrics_engine import Event
+
+    events = _demo_events(num_other_users=20)
+    ev = events["user_1"][0]
+    assert isinstance(ev, Event) and not hasattr(ev, "__dict__")
+    assert ev.user_id is events["user_1"][-1].user_id
+    assert Event.from_dict(ev.to_dict()) == ev
+
+    as_dicts = {user: [e.to_dict() for e in evs] for user, evs in events.items()}
+    expected = compute_metrics_from_events(as_dicts, days=10, seed=7)
+    assert compute_metrics_from_events(events, days=10, seed=7) == expected
+
+
+def test_event_columns_round_trip_through_records():
+    pytest.importorskip("numpy")
+    from metrics_engine.columnar import EventColumns
+
+    cols = EventColumns.from_user_events(_demo_events(num_other_users=5))
+    records = cols.to_records()
+    assert records.dtype.itemsize == 17
+    back = EventColumns.from_records(cols.users, records)
+    for name in ("user_idx", "day", "action", "amount"):
+        assert (getattr(back, name) == getattr(cols, name)).all()
+
+
+def test_out_of_core_log_matches_in_memory(tmp_path):
+    from metrics_engine.chunked import ChunkConfig, compute_metrics_from_log, write_event_log
+
+    events = _demo_events(num_other_users=30)
+    log = tmp_path / "events.jsonl"
+    write_event_log(events, str(log))
+    expected = compute_metrics_from_events(events, days=10, seed=7)
+
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+    config = ChunkConfig(batch_size=17, temp_dir=str(spill_dir))
+    result = compute_metrics_from_log(str(log), days=10, config=config)
+
+    assert result["days"] == expected["days"]
+    for user, scores in expected["daily_scores"].items():
+        for day, s in scores.items():
+            assert result["daily_scores"][user][day] == pytest.approx(s)
+    assert list(spill_dir.iterdir()) == []
+
+
+
+def test_csv_log_treats_empty_cells_as_missing(tmp_path):
+    from metrics_engine.chunked import iter_event_batches
+
+    log = tmp_path / "events.csv"
+    log.write_text(
+        "user_id,timestamp,action_type,amount,asset\n"
+        "ana,86400,stake,,\n"
+        "ana,2024-01-02T00:00:00Z,buy,5,QUBIC\n",
+        encoding="utf-8",
+    )
+    (batch,) = iter_event_batches(str(log))
+    assert [(e.amount, e.asset) for e in batch] == [(0.0, "QUBIC"), (5.0, "QUBIC")]
+    assert batch[0].ts == 86400
+
+def test_bms_windows_match_direct_computation():
+    from metrics_engine.metrics_engine import _compute_BMS
+    from metrics_engine.windows import BMSWindows
+
+    result = compute_metrics(USER_ACTIONS, num_other_users=20, days=12, seed=5)
+    windows = BMSWindows.from_result(result)
+    days = result["days"]
+    for user in ("you", "user_4"):
+        assert windows.bms_window(user) == pytest.approx(result["BMS"][user])
+        for start, end in ((0, 6), (3, 9), (6, 12)):
+            direct = _compute_BMS({user: result["daily_scores"][user]}, days[start:end])
+            assert windows.bms_window(user, start, end) == pytest.approx(direct[user])
+        assert windows.bms_window(user, days[2], days[8]) == windows.bms_window(user, 2, 8)
+
+    history = windows.history()["you"]
+    assert history["past"] == pytest.approx(windows.bms_window("you", 0, 6)["BMS%"])
+    assert history["future"] == pytest.approx(windows.bms_window("you", 6, 12)["BMS%"])
+
+
+def test_crowd_baseline_scores_you_like_a_full_run(tmp_path):
+    from metrics_engine.baseline import CrowdBaseline, get_baseline
+
+    # A baseline anchored to an earlier day is pruned on the next build.
+    (tmp_path / "baseline-1-0000000000000000.bin").write_bytes(b"old")
+    baseline = get_baseline(str(tmp_path), num_other_users=30, days=10, seed=4)
+    loaded = get_baseline(str(tmp_path), num_other_users=30, days=10, seed=4)
+    assert loaded.version == baseline.version and len(list(tmp_path.iterdir())) == 1
+
+    full = compute_metrics(USER_ACTIONS, num_other_users=30, days=10, seed=4)
+    result = loaded.score_actions(USER_ACTIONS)
+    assert result["days"] == full["days"]
+    assert result["daily_scores"]["you"] == full["daily_scores"]["you"]
+    assert result["BMS"]["you"] == full["BMS"]["you"]
+
+    with pytest.raises(ValueError):
+        CrowdBaseline.load(str(next(tmp_path.iterdir())), expected_version="stale")
+
+
+def test_parameter_sweep_shares_work_and_matches_compute_metrics():
+    from metrics_engine.metrics_engine import _compute_BMS_history, _compute_CFS
+    from metrics_engine.sweep import run_sweep
+
+    events = _demo_events(num_other_users=30)
+    expected = compute_metrics_from_events(events, days=10, seed=7)
+    rows = run_sweep(
+        events,
+        weights_grid=[{}, {"buy": 4.0}],
+        epsilons=[0.25, 0.5],
+        deltas=[5.0, 10.0],
+        tols=[3.0, 1.0],
+        days=10,
+    )
+    assert len(rows) == 16
+    stock = rows[0]
+    assert (stock["weights"], stock["epsilon"], stock["tol"], stock["delta"]) == (0, 0.25, 3.0, 5.0)
+    assert stock["BMS%"] == pytest.approx(expected["BMS"]["you"]["BMS%"])
+    assert stock["Improve%"] == pytest.approx(expected["CFS"]["Improve%"])
+
+    history = _compute_BMS_history(expected["daily_scores"], expected["days"])
+    wide = _compute_CFS(history, delta=10.0, tol=1.0)
+    assert rows[3]["cohort_size"] == wide["cohort_size"]
+    assert rows[3]["Decline%"] == pytest.approx(wide["Decline%"])
+    assert rows[8]["weight_buy"] == 4.0
+
+    with pytest.raises(ValueError, match="biy"):
+        run_sweep(events, weights_grid=[{"buy": 2.0}, {"biy": 4.0}], days=10)
+
+
+def test_monte_carlo_is_reproducible_and_stops_early():
+    from metrics_engine.montecarlo import iter_monte_carlo, monte_carlo_metrics
+
+    kwargs = dict(num_other_users=8, days=5, seed=11, max_runs=12, min_runs=4, tolerance=0.0)
+    serial = list(iter_monte_carlo(USER_ACTIONS, workers=1, batch_size=4, **kwargs))
+    assert [s["runs"] for s in serial] == [4, 8, 12]
+    assert not serial[-1]["converged"]
+    pooled = monte_carlo_metrics(USER_ACTIONS, workers=2, batch_size=6, **kwargs)
+    assert pooled["metrics"] == serial[-1]["metrics"]
+
+    bms = serial[-1]["metrics"]["BMS%"]
+    assert bms["p_lo"] <= bms["mean"] <= bms["p_hi"]
+
+    loose = dict(kwargs, tolerance=1000.0)
+    runs = list(iter_monte_carlo(USER_ACTIONS, workers=1, batch_size=2, **loose))
+    assert runs[-1]["converged"] and runs[-1]["runs"] == 4
+
+
+def test_map_reduce_exact_matches_single_process():
+    import json
+
+    from metrics_engine.mapreduce import map_shard, partition_events, reduce_partials, run_local
+
+    events = _demo_events(num_other_users=300)
+    expected = compute_metrics_from_events(events, days=10, seed=7)
+    assert run_local(events, n_shards=3, days=10, workers=1) == expected
+    assert run_local(events, n_shards=5, days=10, workers=2) == expected
+
+    # Exact partials survive a JSON round trip, e.g. between hosts.
+    partials = [json.loads(json.dumps(map_shard(s))) for s in partition_events(events, 4)]
+    assert reduce_partials(partials, days=10) == expected
+
+    approx = run_local(events, n_shards=3, days=10, workers=1, mode="approx", seed=1)
+    assert approx["score_mode"] == "approx"
+    day = expected["days"][-1]
+    for user in ("you", "user_9"):
+        got, want = approx["daily_scores"][user][day], expected["daily_scores"][user][day]
+        assert abs(got["BSS"] - want["BSS"]) <= 3.0
+
+
+def test_rollups_cover_long_windows_with_few_buckets():
+    from metrics_engine.metrics_engine import _compute_BMS
+    from metrics_engine.rollups import MetricRollups, _cover
+    from metrics_engine.windows import BMSWindows
+
+    result = compute_metrics(USER_ACTIONS, num_other_users=15, days=60, seed=2)
+    rollups = MetricRollups.from_result(result)
+    days = result["days"]
+    start = _epoch_day_of(days[0])
+    assert len(days) == 60
+    for user in ("you", "user_3"):
+        got = rollups.bms(user, start, start + 60)
+        assert got == pytest.approx(BMSWindows.from_result(result).bms_window(user))
+        assert got == pytest.approx(_compute_BMS(result["daily_scores"], days)[user])
+
+    assert len(list(_cover(start, start + 365))) <= 40
+
+    # Rescoring a day replaces its contribution at every level.
+    rollups.update("you", start, 100.0, 100.0)
+    week = rollups.series("you", "week", start, start + 1)[0]
+    rollups.update("you", start, 0.0, 0.0)
+    rescored = rollups.series("you", "week", start, start + 1)[0]
+    assert rescored["BSS"] == pytest.approx(week["BSS"] - 100.0)
+
+
+def test_streaming_engine_feeds_rollups():
+    from metrics_engine import MetricsEngine
+    from metrics_engine.rollups import MetricRollups
+
+    events = _demo_events(num_other_users=10)
+    engine = MetricsEngine.from_user_events(events, days=10, seed=7, rollups=MetricRollups())
+    snapshot = engine.snapshot()
+    expected = MetricRollups.from_result(snapshot)
+    first = _epoch_day_of(snapshot["days"][0])
+    for user in ("you", "user_2"):
+        assert engine.rollups.bms(user, first, first + 10) == pytest.approx(
+            expected.bms(user, first, first + 10)
+        )
+
+
+def test_strain_anomaly_detector_flags_spikes_once():
+    from metrics_engine import MetricsEngine
+    from metrics_engine.anomaly import StrainAnomalyDetector
+
+    day = 20000 * 86400
+    quiet = [
+        {"user_id": "u", "timestamp": day + d * 86400, "action_type": "buy", "amount": 10.0 + d % 3}
+        for d in range(10)
+    ]
+    spike = [
+        {"user_id": "u", "timestamp": day + 10 * 86400, "action_type": "stake", "amount": 900.0}
+        for _ in range(5)
+    ]
+    detector = StrainAnomalyDetector(warmup_days=5)
+    assert detector.backfill({"u": quiet}) == []
+    flagged = detector.observe_many(spike)
+    assert len(flagged) == 1 and flagged[0]["z"] > 3.0
+    assert list(detector.records) == flagged
+
+    detector.observe(quiet[0])
+    assert detector.late_events == 1
+
+    seen = []
+    engine = MetricsEngine(detector=StrainAnomalyDetector(sink=seen.append))
+    engine.ingest_many(quiet + spike)
+    assert [r["day"] for r in seen] == [flagged[0]["day"]]
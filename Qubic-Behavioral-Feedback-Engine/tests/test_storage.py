@@ -0,0 +1,357 @@
+import json
+import threading
+
+import pytest
+
+from app import storage
+
+
+def _state(xp=0, events=0):
+    return {
+        "username": "ana",
+        "xp": xp,
+        "xp_events": [{"i": i} for i in range(events)],
+        "test_history": [],
+        "token_trades": [],
+    }
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path))
+    yield tmp_path
+    storage.flush_pending_writes()
+    storage.set_backend("json")
+    storage._history_written.clear()
+    storage._fingerprints.clear()
+    storage._state_cache.clear()
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request, data_dir):
+    if request.param == "sqlite":
+        storage.set_backend(storage.SQLiteBackend(str(data_dir / "users.db")))
+    else:
+        storage.set_backend("json")
+    return storage.get_backend()
+
+
+def test_unknown_backend_name_is_an_error(data_dir, monkeypatch):
+    monkeypatch.setenv(storage.STORAGE_BACKEND_ENV, "sqllite")
+    monkeypatch.setattr(storage, "_backend", None)
+    with pytest.raises(ValueError, match="sqllite"):
+        storage.get_backend()
+    with pytest.raises(ValueError):
+        storage.set_backend("postgres")
+
+
+def test_backends_round_trip_state_and_history(backend):
+    storage.save_user_state("ana", _state(xp=3, events=2))
+    loaded = storage.load_user_state("ana")
+    assert loaded == _state(xp=3, events=2)
+    assert storage.load_user_state("ana", include_history=False) == {"username": "ana", "xp": 3}
+    assert storage.load_user_state("nobody") is None
+
+
+def test_sqlite_pool_reuses_connections_across_threads(data_dir):
+    backend = storage.SQLiteBackend(str(data_dir / "users.db"), pool_size=2)
+    storage.set_backend(backend)
+    threads = [
+        threading.Thread(target=storage.save_user_state, args=(f"u{i}", _state(xp=i, events=1)))
+        for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(backend._idle) <= 2
+    assert [storage.load_user_state(f"u{i}")["xp"] for i in range(8)] == list(range(8))
+
+
+def test_migrate_json_to_sqlite_copies_snapshots_and_logs(data_dir):
+    storage.save_user_state("ana", _state(xp=5, events=3))
+    # A pre-log save still holding its history inline.
+    legacy = _state(xp=1)
+    legacy["test_history"] = [{"score": 9}]
+    (data_dir / "user_bo.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    db = str(data_dir / "users.db")
+    assert storage.migrate_json_to_sqlite(db, str(data_dir)) == 2
+    # Re-running does not duplicate the logs.
+    assert storage.migrate_json_to_sqlite(db, str(data_dir)) == 2
+
+    storage.set_backend(storage.SQLiteBackend(db))
+    assert storage.load_user_state("ana") == _state(xp=5, events=3)
+    assert storage.load_user_state("bo")["test_history"] == [{"score": 9}]
+
+
+def test_history_appends_only_new_records_and_truncates_shorter_lists(backend):
+    state = _state(events=2)
+    state["token_trades"] = [{"t": 1}]
+    storage.save_user_state("ana", state)
+    state["xp_events"].append({"i": 2})
+    storage.save_user_state("ana", state)
+    assert backend.history_counts("ana") == {"xp_events": 3, "token_trades": 1}
+
+    # A reset empties xp_events; the other logs survive the rewrite.
+    state["xp_events"] = [{"i": "new"}]
+    storage.save_user_state("ana", state)
+    loaded = storage.load_user_state("ana")
+    assert loaded["xp_events"] == [{"i": "new"}]
+    assert loaded["token_trades"] == [{"t": 1}]
+
+
+def test_json_truncate_keeps_other_logs_if_the_rewrite_fails(data_dir, monkeypatch):
+    storage.set_backend("json")
+    state = _state(events=2)
+    state["token_trades"] = [{"t": 1}]
+    storage.save_user_state("ana", state)
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m, pytest.raises(OSError):
+        m.setattr(storage.os, "replace", fail)
+        storage.get_backend().truncate_history("ana", "xp_events")
+    assert storage.get_backend().history_counts("ana") == {"xp_events": 2, "token_trades": 1}
+    assert [p.name for p in data_dir.iterdir() if p.name.endswith(".tmp")] == []
+
+
+def test_json_append_drops_a_torn_last_line(data_dir):
+    storage.set_backend("json")
+    backend = storage.get_backend()
+    backend.append_history("ana", "xp_events", [{"i": 0}])
+    log = data_dir / "user_ana.history.jsonl"
+    with open(log, "a", encoding="utf-8") as f:
+        f.write('{"k":"xp_events","r":{"i"')
+    backend.append_history("ana", "xp_events", [{"i": 1}])
+    assert backend.load_history("ana") == {"xp_events": [{"i": 0}, {"i": 1}]}
+    assert log.read_text(encoding="utf-8").endswith("\n")
+
+
+def test_legacy_inline_history_loads_and_moves_to_the_log(data_dir):
+    storage.set_backend("json")
+    legacy = _state(xp=1, events=2)
+    (data_dir / "user_ana.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    loaded = storage.load_user_state("ana")
+    assert loaded == legacy
+    storage.save_user_state("ana", loaded)
+    snapshot = json.loads((data_dir / "user_ana.json").read_text(encoding="utf-8"))
+    assert "xp_events" not in snapshot
+    assert storage.load_user_state("ana") == legacy
+
+
+def test_persist_skips_unchanged_state(data_dir):
+    state = _state(xp=1)
+    assert storage.persist_user_state("ana", state)
+    assert not storage.persist_user_state("ana", state)
+    state["xp_events"].append({"i": 0})
+    assert storage.persist_user_state("ana", state)
+    assert storage.persist_user_state("ana", state, force=True)
+    storage.flush_pending_writes()
+    assert storage.load_user_state("ana") == state
+
+    # A freshly loaded state is clean until it changes.
+    storage._fingerprints.clear()
+    storage.mark_state_clean("ana", storage.load_user_state("ana"))
+    assert not storage.persist_user_state("ana", state)
+
+
+def test_background_writer_coalesces_a_burst(data_dir):
+    before = storage.writer_stats()
+    state = _state()
+    with storage._writer._write_lock:
+        # The writer blocks on the first snapshot; the rest pile up.
+        for xp in range(50):
+            state["xp"] = xp
+            state["xp_events"].append({"i": xp})
+            storage.persist_user_state("ana", state)
+    storage.flush_pending_writes()
+    after = storage.writer_stats()
+    assert after["pending"] == 0
+    assert after["written"] - before["written"] <= 2
+    assert after["coalesced"] - before["coalesced"] >= 48
+    loaded = storage.load_user_state("ana")
+    assert loaded["xp"] == 49 and len(loaded["xp_events"]) == 50
+
+
+def test_load_waits_only_for_its_own_user(data_dir, monkeypatch):
+    release = threading.Event()
+    real_save = storage.save_user_state
+
+    def slow_save(user_id, state):
+        if user_id == "slow":
+            release.wait(5)
+        real_save(user_id, state)
+
+    monkeypatch.setattr(storage, "save_user_state", slow_save)
+    storage.save_user_state("ana", _state(xp=1))
+    storage.persist_user_state("slow", _state(xp=2))
+    try:
+        assert storage.load_user_state("ana")["xp"] == 1
+        assert storage.writer_stats()["pending"] == 1
+    finally:
+        release.set()
+    assert storage.load_user_state("slow")["xp"] == 2
+
+
+def test_json_save_replaces_atomically(data_dir, monkeypatch):
+    storage.set_backend("json")
+    storage.save_user_state("ana", _state(xp=1))
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(storage.os, "replace", fail)
+        storage.save_user_state("ana", _state(xp=2))
+    assert storage.load_user_state("ana")["xp"] == 1
+    assert [p.name for p in data_dir.iterdir() if p.name.endswith(".tmp")] == []
+
+
+def test_pending_writes_flush_at_exit(data_dir):
+    import os
+    import subprocess
+    import sys
+
+    script = (
+        "from app import storage\n"
+        f"storage.DATA_DIR = {str(data_dir)!r}\n"
+        "storage.persist_user_state('ana', {'xp': 7, 'xp_events': [{'i': 0}]})\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", script], cwd=root, check=True)
+    assert storage.load_user_state("ana") == {
+        "xp": 7,
+        "xp_events": [{"i": 0}],
+        "test_history": [],
+        "token_trades": [],
+    }
+
+
+def test_load_cache_hits_until_the_backend_version_changes(backend):
+    storage.save_user_state("ana", _state(xp=1, events=1))
+    first = storage.load_user_state("ana")
+    first["xp_events"].append({"i": "mine"})
+    again = storage.load_user_state("ana")
+    assert again == _state(xp=1, events=1)
+    assert storage.cache_stats()["hits"] == 1
+
+    # A save invalidates the entry.
+    storage.save_user_state("ana", _state(xp=2, events=2))
+    assert storage.load_user_state("ana") == _state(xp=2, events=2)
+    assert storage.cache_stats()["misses"] == 2
+
+
+def test_caches_key_on_the_store_and_reset_on_set_backend(data_dir):
+    a = storage.SQLiteBackend(str(data_dir / "a.db"))
+    assert a.key == storage.SQLiteBackend(str(data_dir / "a.db")).key
+    assert a.key != storage.SQLiteBackend(str(data_dir / "b.db")).key
+    assert storage.JsonFileBackend().key == ("json", str(data_dir))
+
+    storage.set_backend(a)
+    storage.save_user_state("ana", _state(xp=1, events=1))
+    storage.persist_user_state("ana", storage.load_user_state("ana"))
+    storage.flush_pending_writes()
+    storage.load_user_state("ana")
+    assert storage._history_written and storage._fingerprints and storage.cache_stats()["size"]
+
+    storage.set_backend(storage.SQLiteBackend(str(data_dir / "b.db")))
+    assert not storage._history_written and not storage._fingerprints
+    assert storage.cache_stats()["size"] == 0
+    assert storage.load_user_state("ana") is None
+
+
+def test_load_cache_notices_an_outside_edit(data_dir):
+    import os
+
+    storage.set_backend("json")
+    storage.save_user_state("ana", _state(xp=1))
+    assert storage.load_user_state("ana", include_history=False)["xp"] == 1
+    path = data_dir / "user_ana.json"
+    path.write_text(json.dumps({"username": "ana", "xp": 22}), encoding="utf-8")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert storage.load_user_state("ana", include_history=False)["xp"] == 22
+
+
+def test_sqlite_version_tracks_history_revisions(data_dir):
+    backend = storage.SQLiteBackend(str(data_dir / "users.db"))
+    backend.save("ana", {"xp": 1})
+    before = backend.version("ana")
+    backend.append_history("ana", "xp_events", [{"i": 0}])
+    after = backend.version("ana")
+    assert after[0] == before[0] and after[1] == before[1] + 1
+    backend.truncate_history("ana", "xp_events")
+    assert backend.version("ana")[1] == before[1] + 2
+    assert backend.version("nobody") is None
+    backend.close()
+
+
+@pytest.fixture
+def kdf(monkeypatch):
+    monkeypatch.setattr(storage, "KDF_ROUNDS", 1000)
+    monkeypatch.setattr(storage, "_kdf_pool", storage._KdfPool(workers=2, max_queued=8))
+    monkeypatch.setattr(storage, "_login_failures", {})
+    return storage._kdf_pool
+
+
+def test_verify_password_honours_stored_and_legacy_rounds(kdf):
+    state = storage.set_password_fields({}, "hunter2")
+    assert state["auth_pw_rounds"] == 1000
+    assert storage.verify_password(state, "hunter2")
+    assert not storage.verify_password(state, "hunter3")
+
+    # Saves from before auth_pw_rounds was stored used 200,000 rounds.
+    salt = "00" * 16
+    legacy = {"auth_pw_salt": salt, "auth_pw_hash": storage._pbkdf2_hash("pw", salt, 200_000)}
+    assert storage.verify_password(legacy, "pw", user_id="old")
+    assert kdf.stats()["count"] == 4
+
+
+def test_kdf_pool_refuses_work_past_its_queue_limit(kdf, monkeypatch):
+    pool = storage._KdfPool(workers=1, max_queued=1)
+    release = threading.Event()
+    monkeypatch.setattr(storage, "_pbkdf2_hash", lambda *a: release.wait(5) and "h")
+    first = threading.Thread(target=pool.hash, args=("pw", "00", 1))
+    first.start()
+    while pool.stats()["in_flight"] == 0:
+        pass
+    with pytest.raises(storage.AuthBusy):
+        pool.hash("pw", "00", 1)
+    release.set()
+    first.join()
+    assert pool.stats()["rejected"] == 1 and pool.stats()["in_flight"] == 0
+
+
+def test_failed_logins_throttle_even_when_concurrent(kdf):
+    state = storage.set_password_fields({}, "right")
+    results = []
+
+    def guess():
+        try:
+            results.append(storage.verify_password(state, "wrong", user_id="ana"))
+        except storage.AuthThrottled as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=guess) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(False) == storage.LOGIN_ATTEMPTS
+    with pytest.raises(storage.AuthThrottled) as e:
+        storage.verify_password(state, "right", user_id="ana")
+    assert 0 < e.value.retry_after <= storage.LOGIN_WINDOW
+    # Other users are unaffected.
+    assert storage.verify_password(state, "right", user_id="bo")
+
+
+def test_busy_pool_does_not_use_up_login_attempts(kdf, monkeypatch):
+    state = storage.set_password_fields({}, "right")
+    monkeypatch.setattr(storage, "_kdf_pool", storage._KdfPool(workers=1, max_queued=0))
+    for _ in range(storage.LOGIN_ATTEMPTS + 1):
+        with pytest.raises(storage.AuthBusy):
+            storage.verify_password(state, "right", user_id="ana")
+    assert not storage._login_failures.get("ana")